@@ -1,26 +1,85 @@
+import atexit
+import importlib
 import os
 import pathlib
-import logmatic
+import queue
 import logging
+import logging.handlers
 
 ROOT_DIRECTORY = pathlib.Path(os.path.dirname(__file__)) / '..'
 
 # Get a logger by default and set its sensitivity to the maximum
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
+# Records are only written once define_logger is called
+logger.addHandler(logging.NullHandler())
 
+# Subpackages imported on first access
+subpackages = ['data_science', 'database', 'util']
 
-def define_logger(logger):
+# Listeners writing the records of the background loggers
+_listeners = []
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Send records to a bounded queue, either blocking or dropping them when full.
+
+    :param log_queue: queue.Queue or multiprocessing.Queue
+    :param bool block: wether to wait for a free slot when the queue is full
     """
+
+    def __init__(self, log_queue, block=False):
+        super().__init__(log_queue)
+        self.block = block
+        self.dropped = 0
+
+    def enqueue(self, record):
+        if self.block:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def define_logger(logger, background=False, queue_size=10000, block=False, multiprocess=False,
+                  log_queue=None, log_dir=None):
     """
+    Redirect the records of logger to the rotating json log file.
+
+    :param Logger logger: logger to configure
+    :param bool background: format and write the records in a background thread
+    :param int queue_size: maximum number of records waiting to be written in background mode
+    :param bool block: wether logging calls wait or drop their record when the queue is full
+    :param bool multiprocess: use a queue which can be shared with worker processes
+    :param log_queue: queue returned by define_logger in the parent process, to be used in a worker process
+    :param str log_dir: directory of the log files (default=None=ROOT_DIRECTORY/logs)
+
+    :return: the queue of the background mode, None otherwise
+
+    In background mode, pending records are written at exit or by stop_logging.
+    Worker processes must not open the log file themselves : they send
+    their records through the log_queue of the parent.
+
+    Importing pytools does not configure its logger, applications call
+    define_logger(pytools.logger) to write the library records.
+    """
+    if log_queue is not None:
+        logger.addHandler(BoundedQueueHandler(log_queue, block))
+        return log_queue
+
+    import logmatic
+
     # create a logging format as a JSON (works well for rabbit)
     formatter = logmatic.JsonFormatter(
-        fmt="%(levelname) $(name) $(message)", extra={})
+        fmt="%(levelname) %(name) %(message)", extra={})
 
     # Create an object which redirect logs to a text file
     # Keep 10 files of 5MB for history
     # With tuning the logs can be redirected anywhere
-    log_dir = ROOT_DIRECTORY/'logs'
+    log_dir = pathlib.Path(log_dir) if log_dir is not None else ROOT_DIRECTORY/'logs'
     if not log_dir.exists():
         log_dir.mkdir()
     logfilename = log_dir/'happytal_libpython.log'
@@ -29,8 +88,40 @@ def define_logger(logger):
     handler.setLevel(logging.DEBUG)
     handler.setFormatter(formatter)
 
-    # Multiple handlers with different types and sensitivity can be added to a unique logger
-    logger.addHandler(handler)
+    if not background:
+        # Multiple handlers with different types and sensitivity can be added to a unique logger
+        logger.addHandler(handler)
+        return None
+
+    if multiprocess:
+        import multiprocessing
+        log_queue = multiprocessing.Queue(queue_size)
+    else:
+        log_queue = queue.Queue(queue_size)
+    listener = logging.handlers.QueueListener(
+        log_queue, handler, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+
+    logger.addHandler(BoundedQueueHandler(log_queue, block))
+    return log_queue
+
+
+def stop_logging():
+    """
+    Write the pending records of the background loggers and stop their threads.
+    """
+    while _listeners:
+        listener = _listeners.pop()
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+atexit.register(stop_logging)
 
 
-define_logger(logger)
+def __getattr__(name):
+    if name in subpackages:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -1,11 +1,10 @@
+import concurrent.futures
 import logging
 import os
+import time
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import scipy.stats as scstat
-import seaborn as sns
 
 logger = logging.getLogger(__name__)
 
@@ -31,7 +30,7 @@ def description(frame, outdir, target):
 
     binary_cols = [col for col in description[description['nunique']
                                               == 2].index.values if col != target]
-    p_value = [chi2_indep(frame.loc[:, [col, target]]) for col in binary_cols]
+    p_value = batch_chi2_indep(frame, binary_cols, target)
 
     description['p_value_target'] = 1
     description.loc[binary_cols, 'p_value_target'] = p_value
@@ -40,7 +39,218 @@ def description(frame, outdir, target):
     return description
 
 
-def univariate_plot(frame, outdir, target, is_clf):
+def chunked_description(chunks, outdir, target, sample_size=10000, random_state=0):
+    """
+    Save under a csv file the description of a dataset given by chunks.
+
+    :param iterable chunks: DataFrames of the dataset, e.g. request_chunks_from_file or read_csv with chunksize
+    :param str outdir: saving directory, None to only return the description
+    :param str target: target variable with wich compute statistical test
+    :param int sample_size: number of values per column used to estimate the quantiles
+    :param int random_state: seed of the quantiles sampling
+
+    Single pass version of description which never holds the full dataset.
+    Quantiles are computed on a uniform sample of each column and
+    the number of unique values is estimated with an HyperLogLog.
+    """
+    describer = IncrementalDescriber(target, sample_size, random_state)
+    for chunk in chunks:
+        describer.update(chunk)
+    description = describer.description()
+
+    if outdir is not None:
+        description.to_csv(outdir/'description.csv')
+
+    return description
+
+
+class IncrementalDescriber:
+    """
+    Accumulate the statistics of description over chunks of a dataset.
+
+    :param str target: target variable with wich compute statistical test
+    :param int sample_size: number of values per column used to estimate the quantiles
+    :param int random_state: seed of the quantiles sampling
+
+    Like DataFrame.describe, only numeric columns are described.
+    Columns which are no longer numeric in a chunk are dropped with a warning.
+    """
+
+    def __init__(self, target, sample_size=10000, random_state=0):
+        self.target = target
+        self.sample_size = sample_size
+        self.random = np.random.RandomState(random_state)
+
+        self.n_rows = 0
+        self.dtypes = None
+        self.count = None
+        self.mean = None
+        self.m2 = None
+        self.min = None
+        self.max = None
+        # bottom-k sample {col: (keys, values)} : the values with the smallest random keys
+        self.samples = {}
+        self.distincts = {}
+        # exact values and target contingency of the columns with at most 2 values
+        self.binary_values = {}
+        self.binary_counts = {}
+
+    def update(self, chunk):
+        """
+        Add a chunk of the dataset to the statistics.
+        """
+        numeric = chunk.select_dtypes(include='number')
+        if self.dtypes is None:
+            self.dtypes = numeric.dtypes
+            zeros = pd.Series(0., index=numeric.columns)
+            self.count, self.mean, self.m2 = zeros.copy(), zeros.copy(), zeros.copy()
+            self.min = pd.Series(np.nan, index=numeric.columns)
+            self.max = pd.Series(np.nan, index=numeric.columns)
+            for col in numeric.columns:
+                self.distincts[col] = HyperLogLog()
+                self.binary_values[col] = set()
+        dropped = self.dtypes.index.difference(numeric.columns)
+        if len(dropped):
+            # e.g. read_csv infers float for a column empty in the first chunk and object once strings appear
+            logger.warning('non_numeric_columns', extra={'columns': list(dropped)})
+            self._drop(dropped)
+        numeric = numeric.loc[:, self.dtypes.index]
+        self.n_rows += len(chunk)
+
+        # merge of the moments (Chan et al.)
+        count = numeric.count().astype(float)
+        mean = numeric.mean().fillna(0)
+        m2 = (numeric.var(ddof=0) * count).fillna(0)
+        total = self.count + count
+        delta = mean - self.mean
+        ratio = (count / total).fillna(0)
+        self.mean += delta * ratio
+        self.m2 += m2 + delta**2 * self.count * ratio
+        self.count = total
+        self.min = pd.concat([self.min, numeric.min()], axis=1).min(axis=1)
+        self.max = pd.concat([self.max, numeric.max()], axis=1).max(axis=1)
+
+        for col in numeric.columns:
+            values = numeric[col].dropna().values
+            self._update_sample(col, values)
+            self.distincts[col].update(values)
+
+            if self.binary_values[col] is None:
+                continue
+            self.binary_values[col].update(np.unique(values).tolist())
+            if len(self.binary_values[col]) > 2:
+                self.binary_values[col] = None
+                self.binary_counts.pop(col, None)
+            elif col != self.target and self.target in chunk.columns:
+                counts = chunk.groupby([col, self.target]).size()
+                if col in self.binary_counts:
+                    counts = counts.add(self.binary_counts[col], fill_value=0)
+                self.binary_counts[col] = counts
+
+    def _drop(self, columns):
+        """
+        Stop describing columns which are no longer numeric.
+        """
+        self.dtypes = self.dtypes.drop(columns)
+        for name in ['count', 'mean', 'm2', 'min', 'max']:
+            setattr(self, name, getattr(self, name).drop(columns))
+        for col in columns:
+            for values in [self.samples, self.distincts, self.binary_values, self.binary_counts]:
+                values.pop(col, None)
+
+    def _update_sample(self, col, values):
+        keys = self.random.random_sample(len(values))
+        if col in self.samples:
+            keys = np.concatenate([self.samples[col][0], keys])
+            values = np.concatenate([self.samples[col][1], values])
+        if len(keys) > self.sample_size:
+            kept = np.argpartition(keys, self.sample_size)[:self.sample_size]
+            keys, values = keys[kept], values[kept]
+        self.samples[col] = (keys, values)
+
+    def description(self):
+        """
+        Return the description with the same columns as the description function.
+        """
+        description = pd.DataFrame({'count': self.count,
+                                    'mean': self.mean.where(self.count > 0),
+                                    'std': np.sqrt(self.m2 / (self.count - 1)).where(self.count > 1),
+                                    'min': self.min})
+        quantiles = pd.DataFrame(
+            {col: np.quantile(self.samples[col][1], [0.25, 0.5, 0.75])
+             if len(self.samples[col][1]) else [np.nan]*3
+             for col in description.index}, index=['25%', '50%', '75%']).T
+        description = pd.concat([description, quantiles], axis=1)
+        description['max'] = self.max
+
+        description['dtype'] = self.dtypes
+        description['missing_values'] = self.n_rows - self.count.astype(int)
+        description['fraction_missing'] = 100 * \
+            description['missing_values'] / self.n_rows
+
+        description['nunique'] = [len(self.binary_values[col]) if self.binary_values[col] is not None
+                                  else self.distincts[col].cardinality()
+                                  for col in description.index]
+        description.sort_index(inplace=True)
+
+        import scipy.stats as scstat
+
+        description['p_value_target'] = 1
+        for col, counts in self.binary_counts.items():
+            if len(self.binary_values[col]) == 2:
+                description.loc[col, 'p_value_target'] = scstat.chi2_contingency(
+                    counts.unstack().fillna(0))[1]
+
+        return description
+
+
+class HyperLogLog:
+    """
+    Estimator of the number of distinct values of a stream.
+
+    :param int precision: log2 of the number of registers, the relative error is about 1.04/sqrt(2**precision)
+    """
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(2**precision, dtype=np.uint8)
+
+    def update(self, values):
+        """
+        Add an array of values to the estimator.
+        """
+        if not len(values):
+            return
+        hashes = pd.util.hash_array(np.asarray(values))
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.int64)
+        rest = hashes & np.uint64(2**bits - 1)
+
+        # position of the leftmost 1 in the remaining bits
+        bit_length = np.zeros(len(rest), dtype=np.int64)
+        non_zero = rest > 0
+        bit_length[non_zero] = np.floor(
+            np.log2(rest[non_zero].astype(float))).astype(np.int64) + 1
+        rank = (bits - bit_length + 1).astype(np.uint8)
+
+        np.maximum.at(self.registers, index, rank)
+
+    def cardinality(self):
+        """
+        Return the estimated number of distinct values.
+        """
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m**2 / np.sum(2.0**-self.registers.astype(float))
+
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+
+        return int(round(estimate))
+
+
+def univariate_plot(frame, outdir, target, is_clf, n_jobs=1, sample=None):
     """
     Draw the distribution of the variable.
 
@@ -48,56 +258,259 @@ def univariate_plot(frame, outdir, target, is_clf):
     :param str outdir: saving directory
     :param str target: target variable column name
     :param bool is_clf: wether the problem is a classification
+    :param int n_jobs: number of processes drawing the plots
+    :param int sample: maximum number of rows used for the explicative variables plots (default=None=all)
+
+    :return DataFrame: manifest of the written files with the drawing duration
 
     Draw a violin plot for explicative variables and an histogram for
     the target variable.
+    With several jobs, the plots are rendered with the Agg backend and the frame is sent once to each process.
     """
 
     corr = get_correlation(frame, outdir)
 
-    for col in frame.columns:
-        logger.info('plot', extra={'var': col})
-        plt.figure()
-        if col == target:
-            sns.distplot(frame[col], kde=False)
-        elif is_clf:
-            sns.violinplot(x=target, y=col, data=frame, cut=0, sclae='area')
-        else:
-            sns.regplot(x=col, y=target, data=frame)
+    sampled = (frame if sample is None or len(frame) <= sample
+               else frame.sample(n=sample, random_state=0))
 
+    tasks = []
+    for col in frame.columns:
+        correlation = None
         if not (set([col, target]) - set(corr.columns)):
-            plt.title('correlation : {:2.2f}'
-                      .format(0
-                              if pd.isna(corr.loc[col, target]) else
-                              corr.loc[col, target]))
+            correlation = (0 if pd.isna(corr.loc[col, target])
+                           else corr.loc[col, target])
+        tasks.append((col, target, is_clf, correlation,
+                      str(outdir/'univariate_{}.png'.format(col))))
 
-        plt.tight_layout()
-        plt.savefig(str(outdir/'univariate_{}.png'.format(col)))
-        plt.close()
+    if n_jobs == 1:
+        _share_plot_frame(sampled, frame[target], use_agg=False)
+        manifest = [_plot_column(*task) for task in tasks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=n_jobs, initializer=_share_plot_frame,
+                initargs=(sampled, frame[target])) as executor:
+            manifest = list(executor.map(_plot_column, *zip(*tasks)))
+    _share_plot_frame(None, None, use_agg=False)
 
+    return pd.DataFrame(manifest, columns=['column', 'file', 'duration'])
 
-def get_correlation(frame, outdir=None):
+
+# Data drawn by _plot_column, set once per process by _share_plot_frame
+_plot_frame = None
+_plot_target = None
+
+
+def _share_plot_frame(frame, target, use_agg=True):
+    """
+    Set the data drawn by the _plot_column calls of the current process.
+    """
+    global _plot_frame, _plot_target
+    if use_agg:
+        import matplotlib
+        matplotlib.use('Agg')
+    _plot_frame = frame
+    _plot_target = target
+
+
+def _plot_column(col, target, is_clf, correlation, filename):
+    """
+    Draw and save the plot of a single column of the shared frame.
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    start_time = time.perf_counter()
+    logger.info('plot', extra={'var': col})
+    plt.figure()
+    if col == target:
+        sns.distplot(_plot_target, kde=False)
+    elif is_clf:
+        sns.violinplot(x=target, y=col, data=_plot_frame, cut=0, scale='area')
+    else:
+        sns.regplot(x=col, y=target, data=_plot_frame)
+
+    if correlation is not None:
+        plt.title('correlation : {:2.2f}'.format(correlation))
+
+    plt.tight_layout()
+    plt.savefig(filename)
+    plt.close()
+
+    return {'column': col, 'file': filename, 'duration': time.perf_counter() - start_time}
+
+
+def get_correlation(frame, outdir=None, block_size=None, max_heatmap=200):
     """
     Draw a correlation heatmap and return the frame.
 
     :param DataFrame frame: data 
     :param str outdir: saving directory ( default=None=no saving)
+    :param int block_size: compute with blocked_correlation on tiles of block_size columns (default=None=DataFrame.corr)
+    :param int max_heatmap: maximum number of columns in the heatmap (default=200, None=no limit, 0=no heatmap)
+
+    Above max_heatmap columns, the heatmap only shows the columns
+    with the highest mean absolute correlation.
     """
 
-    corr = frame.corr()
+    corr = frame.corr() if block_size is None else blocked_correlation(
+        frame, block_size)
 
     if outdir != None:
         corr.to_csv(outdir/'correlation.csv')
-        plt.figure()
-        sns.heatmap(corr, cmap=plt.cm.RdYlBu_r)
-        plt.title('Correlation Heatmap')
-        plt.tight_layout()
-        plt.savefig(str(outdir/'correlation.png'))
-        plt.close()
+
+        drawn = corr
+        if max_heatmap is not None and len(corr) > max_heatmap:
+            logger.info('heatmap_downsample', extra={
+                        'n_cols': len(corr), 'max_heatmap': max_heatmap})
+            kept = corr.abs().mean().nlargest(max_heatmap).index
+            drawn = corr.loc[kept, kept]
+
+        if len(drawn):
+            import matplotlib.pyplot as plt
+            import seaborn as sns
+
+            plt.figure()
+            sns.heatmap(drawn, cmap=plt.cm.RdYlBu_r)
+            plt.title('Correlation Heatmap')
+            plt.tight_layout()
+            plt.savefig(str(outdir/'correlation.png'))
+            plt.close()
 
     return corr
 
 
+def blocked_correlation(frame, block_size=1000, dtype=np.float32, filename=None):
+    """
+    Return the correlation matrix of the numeric columns computed by tiles of columns.
+
+    :param DataFrame frame: data
+    :param int block_size: number of columns of each tile
+    :param dtype: precision of the computation
+    :param str filename: .npy file in which the matrix is written (default=None=in memory)
+
+    Like DataFrame.corr, correlations use the pairwise complete observations.
+    With a filename, the matrix is stored in a memory mapped file and tiles
+    are written as they are computed.
+    """
+    values, columns = _centered_values(frame, dtype)
+
+    n_cols = len(columns)
+    if filename is None:
+        corr = np.empty((n_cols, n_cols), dtype=dtype)
+    else:
+        corr = np.lib.format.open_memmap(
+            str(filename), mode='w+', dtype=dtype, shape=(n_cols, n_cols))
+
+    for (start0, end0), (start1, end1), tile in _correlation_tiles(values, block_size):
+        corr[start0:end0, start1:end1] = tile
+        corr[start1:end1, start0:end0] = tile.T
+
+    return pd.DataFrame(corr, index=columns, columns=columns)
+
+
+def top_correlations(frame, k=100, block_size=1000, dtype=np.float32):
+    """
+    Return the k pairs of numeric columns with the highest absolute correlation.
+
+    :param DataFrame frame: data
+    :param int k: number of pairs
+    :param int block_size: number of columns of each tile
+    :param dtype: precision of the computation
+
+    :return DataFrame: columns var0, var1, correlation sorted by decreasing absolute correlation
+
+    Only k candidates are kept in memory between tiles.
+    """
+    values, columns = _centered_values(frame, dtype)
+
+    best = (np.empty(0, dtype=np.int64), np.empty(
+        0, dtype=np.int64), np.empty(0, dtype=dtype))
+    for (start0, end0), (start1, end1), tile in _correlation_tiles(values, block_size):
+        rows, cols = np.nonzero(~np.isnan(tile))
+        rows, cols = rows + start0, cols + start1
+        upper = rows < cols
+        rows, cols = rows[upper], cols[upper]
+        candidates = (np.concatenate([best[0], rows]),
+                      np.concatenate([best[1], cols]),
+                      np.concatenate([best[2], tile[rows - start0, cols - start1]]))
+        if len(candidates[2]) > k:
+            kept = np.argpartition(-np.abs(candidates[2]), k)[:k]
+            candidates = tuple(x[kept] for x in candidates)
+        best = candidates
+
+    order = np.argsort(-np.abs(best[2]), kind='mergesort')
+    return pd.DataFrame({'var0': columns[best[0][order]],
+                         'var1': columns[best[1][order]],
+                         'correlation': best[2][order]})
+
+
+def target_correlation(frame, target, block_size=1000, dtype=np.float32):
+    """
+    Return the correlation of each numeric column with the target.
+
+    :param DataFrame frame: data
+    :param str target: target variable column name
+    :param int block_size: number of columns of each tile
+    :param dtype: precision of the computation
+
+    :return Series: correlations indexed by column, without the target
+    """
+    values, columns = _centered_values(frame.drop(columns=target), dtype)
+    target_values, _ = _centered_values(frame.loc[:, [target]], dtype)
+
+    corr = np.concatenate([_correlation_tile(values[:, start:start+block_size], target_values)[:, 0]
+                           for start in range(0, len(columns), block_size)]
+                          or [np.empty(0, dtype=dtype)])
+
+    return pd.Series(corr, index=columns, name=target)
+
+
+def _centered_values(frame, dtype):
+    """
+    Return the numeric columns values centered on their mean, and their names.
+    """
+    numeric = frame.select_dtypes(include=['number', 'bool'])
+    values = numeric.values.astype(dtype)
+    with np.errstate(invalid='ignore'):
+        values -= np.nanmean(values, axis=0) if len(values) else 0
+
+    return values, numeric.columns
+
+
+def _correlation_tiles(values, block_size):
+    """
+    Yield the column ranges and the correlations of the upper triangular tiles.
+    """
+    n_cols = values.shape[1]
+    for start0 in range(0, n_cols, block_size):
+        end0 = min(start0 + block_size, n_cols)
+        for start1 in range(start0, n_cols, block_size):
+            end1 = min(start1 + block_size, n_cols)
+            yield ((start0, end0), (start1, end1),
+                   _correlation_tile(values[:, start0:end0], values[:, start1:end1]))
+
+
+def _correlation_tile(values0, values1):
+    """
+    Return the correlations between the columns of two arrays on their pairwise complete observations.
+    """
+    mask0 = (~np.isnan(values0)).astype(values0.dtype)
+    mask1 = (~np.isnan(values1)).astype(values1.dtype)
+    values0 = np.nan_to_num(values0)
+    values1 = np.nan_to_num(values1)
+
+    count = mask0.T @ mask1
+    sum0 = values0.T @ mask1
+    sum1 = mask0.T @ values1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = values0.T @ values1 - sum0 * sum1 / count
+        var0 = (values0**2).T @ mask1 - sum0**2 / count
+        var1 = mask0.T @ values1**2 - sum1**2 / count
+        corr = cov / np.sqrt(var0 * var1)
+
+    return np.clip(corr, -1, 1)
+
+
 def chi2_indep(df):
     """
     Compute the p_value of variable independence.
@@ -106,6 +519,8 @@ def chi2_indep(df):
     Duplicated columns are removed.
     """
 
+    import scipy.stats as scstat
+
     # clean duplicated columns
     df = df.loc[:, ~df.columns.duplicated()]
     if len(df.columns) != 2:
@@ -118,6 +533,57 @@ def chi2_indep(df):
     return p_value
 
 
+def batch_chi2_indep(frame, columns, target):
+    """
+    Compute the p_value of independence between each binary column and the target.
+
+    :param DataFrame frame: data
+    :param list columns: columns with at most two distinct values
+    :param str target: target variable
+
+    :return Series: p_value indexed by column
+
+    Equivalent to chi2_indep on each (column, target) pair, all the
+    contingency tables being counted at once with a single bincount.
+    """
+    import scipy.stats as scstat
+
+    if not len(columns):
+        return pd.Series(dtype=float)
+
+    target_codes, target_values = pd.factorize(frame[target])
+    n_target = max(len(target_values), 1)
+
+    codes = np.column_stack([pd.factorize(frame[col])[0] for col in columns])
+    if codes.max() > 1:
+        raise RuntimeError('Non binary columns')
+    cells = codes * n_target + target_codes[:, None]
+    cells += np.arange(codes.shape[1]) * 2 * n_target
+    valid = (codes >= 0) & (target_codes >= 0)[:, None]
+    observed = np.bincount(cells[valid], minlength=codes.shape[1] * 2 * n_target
+                           ).reshape((-1, 2, n_target)).astype(float)
+
+    # Same computation as scipy.stats.chi2_contingency, ignoring empty rows and columns
+    row_sums = observed.sum(axis=2)
+    col_sums = observed.sum(axis=1)
+    total = np.maximum(row_sums.sum(axis=1), 1)
+    expected = row_sums[:, :, None] * col_sums[:, None, :] / total[:, None, None]
+    dof = (np.count_nonzero(row_sums, axis=1) - 1) * \
+        (np.count_nonzero(col_sums, axis=1) - 1)
+
+    diff = expected - observed
+    yates = (dof == 1)[:, None, None]
+    diff = np.where(yates, diff - np.sign(diff) *
+                    np.minimum(0.5, np.abs(diff)), diff)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(expected > 0, diff**2 / expected, 0)
+    chi2 = terms.sum(axis=(1, 2))
+
+    p_value = np.where(dof > 0, scstat.chi2.sf(chi2, np.maximum(dof, 1)), 1.)
+
+    return pd.Series(p_value, index=columns)
+
+
 def missing_values_table(df):
     """
     Return a table with the amount of missing values per column
@@ -1,5 +1,3 @@
-import itertools
-import functools
 import math
 import numpy as np
 import pandas as pd
@@ -32,30 +30,134 @@ def stat_encoding(frame, category, agg=['mean', 'std'], prefix=''):
     return cat
 
 
-def float_to_str(serie):
+class StatEncoder:
     """
-    Transform a serie of float integer (with nan) into str
+    Fitted version of stat_encoding applied to new batches.
+
+    :param list category: columns indentifying categories
+    :param list agg: list of aggregating fucntions to apply
+    :param str prefix: prefix for created columns name
+    :param fallback: value of unseen categories : 'nan', 'global' (aggregation over the whole fitted frame),
+        a scalar or a dict {created column: value}
+
+    The aggregations are stored as an array indexed by the category keys,
+    so that encoding a batch only costs a lookup of its keys.
     """
-    return serie.apply(lambda x: np.nan if pd.isna(x) else str(int(x))).astype(str)
 
+    def __init__(self, category, agg=['mean', 'std'], prefix='', fallback='nan'):
+        self.category = [category] if isinstance(category, str) else list(category)
+        self.agg = agg
+        self.prefix = prefix
+        self.fallback = fallback
+
+    def fit(self, frame):
+        """
+        Compute the aggregations of frame.
+        """
+        cat = stat_encoding(frame, self.category, self.agg, self.prefix)
+        self.columns = [col for col in cat.columns if col not in self.category]
+        self.keys = self._keys(cat)
+        self.values = cat.loc[:, self.columns].values
+
+        if isinstance(self.fallback, dict):
+            self.fallback_values = [self.fallback.get(col, np.nan) for col in self.columns]
+        elif self.fallback == 'global':
+            glob = stat_encoding(frame.drop(columns=self.category).assign(__all__=0),
+                                 '__all__', self.agg, self.prefix)
+            self.fallback_values = glob.loc[0, self.columns].tolist()
+        elif self.fallback == 'nan':
+            self.fallback_values = [np.nan] * len(self.columns)
+        else:
+            self.fallback_values = [self.fallback] * len(self.columns)
+
+        return self
+
+    def transform(self, frame):
+        """
+        Return the aggregations of the categories of frame, aligned with its index.
+        """
+        positions = self.keys.get_indexer(self._keys(frame))
+        values = self.values.take(positions, axis=0)
+
+        unseen = positions < 0
+        if unseen.any():
+            values = np.where(unseen[:, None], np.array(
+                [self.fallback_values]), values)
+
+        return pd.DataFrame(values, columns=self.columns, index=frame.index)
+
+    def fit_transform(self, frame):
+        return self.fit(frame).transform(frame)
+
+    def _keys(self, frame):
+        if len(self.category) == 1:
+            return pd.Index(frame[self.category[0]])
+        return pd.MultiIndex.from_frame(frame.loc[:, self.category])
 
-def group_features(frame, category, agg,  prefix='', translate_names={}):
+    def save(self, filename):
+        """
+        Save the fitted encoder in a pickle file.
+        """
+        pd.to_pickle(self, str(filename))
+
+    @staticmethod
+    def load(filename):
+        """
+        Return the encoder saved in a pickle file.
+        """
+        return pd.read_pickle(str(filename))
+
+
+def float_to_str(serie, na_value='nan', as_category=False):
+    """
+    Transform a serie of float integer (with nan) into str
+
+    :param Series serie: float values, truncated to integers
+    :param na_value: value of missing entries, None to keep them missing
+    :param bool as_category: wether to return a category serie
+
+    Only the distinct values are formatted when a category serie is returned.
+    """
+    missing = serie.isnull().values
+    ints = np.trunc(serie.values[~missing]).astype(np.int64)
+
+    if as_category:
+        codes, uniques = pd.factorize(ints)
+        categories = list(uniques.astype(str))
+        all_codes = np.full(len(serie), -1, dtype=np.int64)
+        all_codes[~missing] = codes
+        if na_value is not None:
+            if na_value not in categories:
+                categories.append(na_value)
+            all_codes[missing] = categories.index(na_value)
+        values = pd.Categorical.from_codes(all_codes, categories=categories)
+    else:
+        values = np.full(len(serie), np.nan if na_value is None else na_value, dtype=object)
+        values[~missing] = ints.astype(str)
+
+    return pd.Series(values, index=serie.index, name=serie.name)
+
+
+def group_features(frame, category, agg,  prefix='', translate_names={}, observed=False):
     """
-    Merge computed group aggregation with frame
+    Map computed group aggregation to the rows of frame
 
     :param DataFrame frame: dataset
     :param dict agg: aggregation functions
     :param list category: grouping columns
+    :param bool observed: for categorical groupers, only use the observed combinations
 
-    :return DataFrame merged: input frame merged with aggregations
+    :return DataFrame merged: aggregations aligned with the index of frame
 
+    Rows with a missing category get missing aggregations.
     """
     if not len(category):
         raise RuntimeError('Need category for stat_encoding')
     if not len(agg):
         raise RuntimeError('Need agg functions for stat_encoding')
 
-    feat = frame.groupby(category).agg(agg)
+    groups = frame.groupby(category, observed=observed)
+    feat = groups.agg(agg)
     feat.columns = [x if isinstance(x, str) else '_'.join(x)
                     for x in feat.columns]
     translations = {col: col+'_' + (fct if isinstance(fct, str) else fct.__name__)
@@ -66,8 +168,16 @@ def group_features(frame, category, agg,  prefix='', translate_names={}):
     feat.columns = [prefix + col for col in feat.columns]
     feat.columns = [translate_names.get(c, c) for c in feat.columns]
 
-    new_vars = pd.merge(frame.loc[:, category], feat, on=category)
-    new_vars.drop(columns=category, inplace=True)
+    # position of the group of each row in feat, -1 for missing categories
+    # feat holds the unobserved combinations of categorical keys, hence the lookup by keys
+    keys = frame[category]
+    if isinstance(feat.index, pd.MultiIndex):
+        keys = pd.MultiIndex.from_frame(keys)
+    elif isinstance(keys, pd.DataFrame):
+        keys = keys.iloc[:, 0]
+    codes = feat.index.get_indexer(keys)
+    new_vars = feat.reset_index(drop=True).reindex(codes)
+    new_vars.index = frame.index
 
     return new_vars
 
@@ -81,10 +191,15 @@ def check_frame_columns(frame, columns):
             raise RuntimeError('Missing column in frame : {}'.format(col))
 
 
-def multi_date_features(frame, date_cols, levels):
+def multi_date_features(frame, date_cols, levels, dtype=None):
     """ Add the date features to the dataframe
 
-    Calls date_features for all columns
+    Calls serie_date_features for all columns
+
+    :param DataFrame frame: dataset
+    :param list date_cols: date columns to featurise
+    :param list levels: portions of the timestamps to featurise
+    :param dtype: output dtype of the features (default=None=inferred)
     """
 
     if isinstance(date_cols, str):
@@ -97,17 +212,57 @@ def multi_date_features(frame, date_cols, levels):
     if not levels:
         raise RuntimeError('No levels')
 
-    part_date_feat = functools.partial(date_features, levels=levels)
-
-    feats = [pd.DataFrame(
-        frame[col].apply(part_date_feat).tolist(), columns=[col + '_' + ''.join(reversed(x))
-                                                            for x in itertools.product(levels, ['', 'cos', 'sin'])], index=frame.index)
-             for col in date_cols
-             ]
+    feats = [serie_date_features(frame[col], levels, dtype=dtype)
+             for col in date_cols]
 
     return pd.concat(feats, axis=1, sort=False)
 
 
+# For each level : accessor of the value in its reference frame and its periodicity.
+# The accessors work both on a Timestamp and on the .dt accessor of a Serie.
+DATE_LEVELS = {
+    'month': (lambda x: x.month, 12),
+    'dayofweek': (lambda x: x.dayofweek, 7),
+    'hourmin': (lambda x: x.minute + x.hour*60, 24 * 60),
+    'weekhour': (lambda x: x.hour + x.dayofweek*24, 24 * 7),
+    'hour': (lambda x: x.hour, 24),
+    'dayofyear': (lambda x: x.dayofyear, 366),
+}
+
+
+def serie_date_features(serie, levels=['month', 'dayofweek', 'hourmin'], dtype=None):
+    """Return the featurisation of a whole column of timestamps
+
+    :param Series serie: dates to parse
+    :param list levels: portions of the timestamps to featurise
+    :param dtype: output dtype of the features (default=None=inferred)
+
+    Columnar version of date_features, the created columns are
+    <name>_<level>, <name>_cos<level>, <name>_sin<level>.
+    NaT gives NaN features and timezone aware dates are featurised in their local time.
+    """
+    if not pd.api.types.is_datetime64_any_dtype(serie):
+        serie = pd.to_datetime(serie)
+
+    feats = {}
+    for lev in levels:
+        if lev not in DATE_LEVELS:
+            continue
+        accessor, period = DATE_LEVELS[lev]
+        val = accessor(serie.dt).values
+
+        pulse = 2*np.pi / period
+        feats[serie.name + '_' + lev] = val
+        feats[serie.name + '_cos' + lev] = np.cos(val*pulse)
+        feats[serie.name + '_sin' + lev] = np.sin(val*pulse)
+
+    feats = pd.DataFrame(feats, index=serie.index)
+    if dtype is not None:
+        feats = feats.astype(dtype)
+
+    return feats
+
+
 def date_features(x, levels=['month', 'dayofweek', 'hourmin']):
     """Return a timestamp featurisation
 
@@ -123,26 +278,10 @@ def date_features(x, levels=['month', 'dayofweek', 'hourmin']):
     """
     features = []
     for lev in levels:
-        if 'month' == lev:
-            val = x.month
-            period = 12
-        elif 'dayofweek' == lev:
-            val = x.dayofweek
-            period = 7
-        elif 'hourmin' == lev:
-            val = x.minute + x.hour*60
-            period = 24 * 60
-        elif 'weekhour' == lev:
-            val = x.hour + x.dayofweek*24
-            period = 24 * 7
-        elif 'hour' == lev:
-            val = x.hour
-            period = 24
-        elif 'dayofyear' == lev:
-            val = x.dayofyear
-            period = 366
-        else:
+        if lev not in DATE_LEVELS:
             continue
+        accessor, period = DATE_LEVELS[lev]
+        val = accessor(x)
 
         pulse = 2*math.pi / period
         features.extend([val, math.cos(val*pulse), math.sin(val*pulse)])
@@ -150,42 +289,61 @@ def date_features(x, levels=['month', 'dayofweek', 'hourmin']):
     return features
 
 
-def single_val_cols(df):
+def single_val_cols(df, block_size=65536):
     """
     Returns the columns which contains a single value.
+
+    :param DataFrame df: data, or an iterable of DataFrame chunks
+    :param int block_size: number of rows compared at once
+
+    Missing values are ignored.
+    Each column is compared by blocks to its first value and dropped from the
+    candidates at the first different value. Chunks are no longer read once
+    no candidate remains.
     """
+    chunks = [df] if isinstance(df, pd.DataFrame) else df
+
+    candidates = None
+    first_values = {}
+    for chunk in chunks:
+        if candidates is None:
+            candidates = list(chunk.columns)
+        candidates = [col for col in candidates
+                      if _is_single_val(chunk[col].values, col, first_values, block_size)]
+        if not candidates:
+            break
+
+    return np.array(candidates or [], dtype=object)
+
 
-    cols_unique_vals = df.nunique(axis=0)
-    cols = cols_unique_vals[cols_unique_vals <= 1].index.values
+def _is_single_val(values, col, first_values, block_size):
+    """
+    Return wether all the non missing values are equal to the first value of the column.
+    """
+    for start in range(0, len(values), block_size):
+        block = values[start:start+block_size]
+        block = block[~pd.isnull(block)]
+        if not len(block):
+            continue
+        first = first_values.setdefault(col, block[0])
+        if (block != first).any():
+            return False
 
-    return cols
+    return True
 
 
 def group_cumulative(df, group, values):
     """
     Cumulative sum within each category.
 
-    It is assumed that the dataset is already sorted by group features, and sorted within each category.
+    The cumulative sum follows the order of the rows within each category,
+    the dataset does not need to be sorted by group features.
+    The output keeps the index of the input.
     """
 
     if not isinstance(group, list):
         group = [group]
     if not isinstance(values, list):
         values = [values]
-    all_cols = group + values
-    df = df.loc[:, all_cols].copy()
-    df.loc[:, values] = df.loc[:, values].cumsum()
-
-    agg_actions = {col: min for col in values}
-    shifted = df.copy()
-    shifted.loc[:, values] = shifted.loc[:, values].shift(1, fill_value=0)
-    min_vals = shifted.groupby(group).agg(agg_actions).fillna(0)
-    min_vals.columns = 'min_'+min_vals.columns
-
-    df = pd.merge(df, min_vals, on=group)
-    df.loc[:, values] -= df.loc[:, ['min_'+c for c in values]].values
-
-    dropped_columns = set(df.columns) - set(values)
-    df.drop(columns=dropped_columns, inplace=True)
 
-    return df
+    return df.groupby(group, sort=False)[values].cumsum()
@@ -0,0 +1,119 @@
+import hashlib
+import logging
+import os
+import pathlib
+import time
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCache:
+    """
+    On-disk cache of query results.
+
+    :param str directory: directory where the results are stored
+    :param float ttl: lifetime of a result in seconds (default=None=no expiration)
+    :param int max_size: maximum total size of the cache in bytes (default=None=no limit)
+    :param str fmt: storage format, 'feather' or 'parquet'
+
+    Results are keyed by the hash of the rendered query and of the target base.
+    The least recently read results are removed first when the cache exceeds max_size.
+    Feather files are read through memory mapping.
+    Both formats require pyarrow (pip install happytal[columnar]).
+    """
+
+    formats = {'feather': '.feather', 'parquet': '.parquet'}
+
+    def __init__(self, directory, ttl=None, max_size=None, fmt='feather'):
+        if fmt not in self.formats:
+            raise RuntimeError('Unknown cache format : {}'.format(fmt))
+
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.fmt = fmt
+
+    def key(self, query, base):
+        """
+        Return the identifier of a query on a base.
+        """
+        return hashlib.sha256('{}\0{}'.format(base, query).encode('utf-8')).hexdigest()
+
+    def path(self, query, base):
+        """
+        Return the file storing the result of a query on a base.
+        """
+        return self.directory/(self.key(query, base) + self.formats[self.fmt])
+
+    def get(self, query, base):
+        """
+        Return the cached result of a query on a base or None if absent or expired.
+        """
+        path = self.path(query, base)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+
+        # the modification time is the writing time, the access time is the last read
+        now = time.time()
+        if self.ttl is not None and now - stat.st_mtime > self.ttl:
+            path.unlink()
+            return None
+        os.utime(str(path), (now, stat.st_mtime))
+
+        logger.debug('cache_hit', extra={'path': str(path)})
+        if self.fmt == 'feather':
+            import pyarrow.feather
+            return pyarrow.feather.read_table(str(path), memory_map=True).to_pandas()
+        return pd.read_parquet(str(path))
+
+    def put(self, query, base, frame):
+        """
+        Store the result of a query on a base and evict old results if needed.
+
+        Frames which can not be converted to Arrow (e.g. mixed types columns) raise pyarrow errors.
+        """
+        path = self.path(query, base)
+        tmp_path = path.with_suffix('.tmp')
+        frame = frame.reset_index(drop=True)
+        try:
+            if self.fmt == 'feather':
+                frame.to_feather(str(tmp_path))
+            else:
+                frame.to_parquet(str(tmp_path))
+            os.replace(str(tmp_path), str(path))
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+        self.evict()
+
+    def invalidate(self, query=None, base=None):
+        """
+        Remove the result of a query on a base, or all the results if no query is given.
+        """
+        paths = ([self.path(query, base)] if query is not None
+                 else self.directory.glob('*' + self.formats[self.fmt]))
+        for path in paths:
+            if path.exists():
+                path.unlink()
+
+    def evict(self):
+        """
+        Remove the least recently read results until the cache size fits max_size.
+        """
+        if self.max_size is None:
+            return
+
+        stats = [(path, path.stat())
+                 for path in self.directory.glob('*' + self.formats[self.fmt])]
+        total_size = sum(stat.st_size for _, stat in stats)
+        for path, stat in sorted(stats, key=lambda x: x[1].st_atime):
+            if total_size <= self.max_size:
+                break
+            path.unlink()
+            total_size -= stat.st_size
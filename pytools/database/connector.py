@@ -3,10 +3,13 @@ import json
 import sqlalchemy
 import base64
 import codecs
-import os
-import pymssql
+import copy
+import functools
 import logging
 import pathlib
+import threading
+
+from . import instrument
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +17,17 @@ default_data_directory = os.path.abspath(
     os.path.join(os.path.dirname(__file__), '../data'))
 default_config_directory = os.getenv('DATA_PASS', default_data_directory)
 
+# Parsed configurations {config_filename: (mtime, size, config_data)}
+_configs = {}
+_configs_lock = threading.Lock()
+
+# Process-wide registry of the engines {(base, config_directory): engine}
+_engines = {}
+_engines_lock = threading.Lock()
+
+# Configuration keys forwarded to the connection pool
+pool_options = ['pool_size', 'max_overflow', 'pool_recycle']
+
 
 def get_config(base, config_directory='.'):
     """Retrieve the configuration for the target database/API from json file.
@@ -23,21 +37,84 @@ def get_config(base, config_directory='.'):
 
     For security reasons, configuration files are not included in the package.
     The configuration files must be located in happytal/data/ directory.
+
+    Parsed files are cached and read again only when their modification time or size change.
     """
     config_filename = pathlib.Path(config_directory)/(base+'.json')
-    logger.debug('get_config( {} )'.format(str(config_filename)))
-    with config_filename.open() as config_file:
-        config_data = json.loads(config_file.read())
+    stat = config_filename.stat()
+
+    with _configs_lock:
+        cached = _configs.get(str(config_filename))
+        if cached is None or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+            logger.debug('get_config( {} )'.format(str(config_filename)))
+            with config_filename.open() as config_file:
+                config_data = json.loads(config_file.read())
+            cached = (stat.st_mtime_ns, stat.st_size, config_data)
+            _configs[str(config_filename)] = cached
 
-    return config_data
+    return copy.deepcopy(cached[2])
+
+
+def load_all(config_directory=default_config_directory):
+    """
+    Load in the cache all the configuration files of a directory.
+
+    :param config_directory: directory containing the json configuration files
+
+    :return list: identifiers of the loaded configurations
+
+    Files which are not valid json are skipped with a warning.
+    """
+    bases = []
+    for config_filename in sorted(pathlib.Path(config_directory).glob('*.json')):
+        try:
+            get_config(config_filename.stem, config_directory)
+        except json.decoder.JSONDecodeError:
+            logger.warning('load_all', extra={
+                           'config_filename': str(config_filename)})
+            continue
+        bases.append(config_filename.stem)
+
+    return bases
 
 
 def get_engine(base, config_directory=default_config_directory):
     """
-    Return an sqlalchemy engine.
+    Return the shared sqlalchemy engine of a database.
+
+    :param base: Identifier of the database.
+    :param config_directory: Name of the file containing databases parameters.
+
+    Engines are created once per (base, config_directory) and then reused
+    with their connection pool by all the calls of the process.
+    """
+    key = (base, str(config_directory))
+    with _engines_lock:
+        if key not in _engines:
+            _engines[key] = create_engine(base, config_directory)
+        return _engines[key]
+
+
+def dispose_all():
+    """
+    Close the connections of all the registered engines and empty the registry.
+    """
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+
+def create_engine(base, config_directory=default_config_directory):
+    """
+    Return a new sqlalchemy engine.
 
     :param base: Identifier of the database.
     :param config_directory: Name of the file containing databases parameters.
+
+    The pool_size, max_overflow and pool_recycle keys of the configuration
+    are forwarded to the connection pool.
+    Queries are measured by the instrument module.
     """
     config_data = get_config(base, config_directory)
     driver_to_prefix = {
@@ -46,6 +123,8 @@ def get_engine(base, config_directory=default_config_directory):
         '{ODBC Driver 17 for SQL Server}': 'sql',
         '{SQLite3 ODBC Driver}': 'sqlite'
     }
+    pool_args = {opt: int(config_data[opt])
+                 for opt in pool_options if opt in config_data}
 
     engine = None
     prefix = driver_to_prefix[config_data['driver']]
@@ -55,12 +134,16 @@ def get_engine(base, config_directory=default_config_directory):
                 driver_to_prefix[config_data['driver']],
                 config_data['database']))
     elif prefix == 'sql':
-        engine = pymssql.connect(
+        import pymssql
+        creator = functools.partial(
+            pymssql.connect,
             host=config_data['server'],
             port=config_data['port'],
             user=config_data['username'],
             password=config_data['password'],
             database=config_data['database'])
+        engine = sqlalchemy.create_engine(
+            'mssql+pymssql://', creator=creator, **pool_args)
 
     else:
         engine = sqlalchemy.create_engine('{}://{}:{}@{}:{}/{}'.format(
@@ -69,11 +152,35 @@ def get_engine(base, config_directory=default_config_directory):
             config_data['password'],
             config_data['server'],
             int(config_data['port']) if 'port' in config_data else 5432,
-            config_data['database']))
+            config_data['database']), **pool_args)
 
+    protect_from_fork(engine)
+    instrument.instrument(engine)
     return engine
 
 
+def protect_from_fork(engine):
+    """
+    Prevent a forked process to use the pooled connections of its parent.
+
+    Connections are tagged with the pid which opened them. When checked out from
+    another process, they are detached from the pool without being closed and
+    a new connection is opened.
+    """
+    @sqlalchemy.event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        connection_record.info['pid'] = os.getpid()
+
+    @sqlalchemy.event.listens_for(engine, 'checkout')
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        pid = os.getpid()
+        if connection_record.info['pid'] != pid:
+            connection_record.connection = connection_proxy.connection = None
+            raise sqlalchemy.exc.DisconnectionError(
+                'Connection record belongs to pid {}, attempting to check out in pid {}'
+                .format(connection_record.info['pid'], pid))
+
+
 def get_header(base, config_directory=default_config_directory):
     """
     Return the header to access an API.
@@ -0,0 +1,176 @@
+import contextlib
+import hashlib
+import logging
+import re
+import threading
+import time
+
+import sqlalchemy
+
+logger = logging.getLogger(__name__)
+
+# Queries lasting longer (in seconds) are logged as slow queries
+slow_query_threshold = 1.
+
+# Aggregated measures of the queries {fingerprint: measures}
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+# Number of measure blocks running in the current thread
+_local = threading.local()
+
+_normalizations = [
+    (re.compile(r'--[^\n]*|/\*.*?\*/', re.DOTALL), ' '),
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%\(\w+\)s|%s|(?<![:\w]):\w+'), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(?)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def normalize(query):
+    """
+    Return the query without comments, with literals and bound parameters replaced by ?.
+
+    Queries which only differ by their values share the same normalized form.
+    """
+    query = str(query)
+    for regexp, replacement in _normalizations:
+        query = regexp.sub(replacement, query)
+    return query.strip().rstrip(';').strip().lower()
+
+
+def fingerprint(query):
+    """
+    Return the identifier of the normalized query.
+    """
+    return hashlib.sha1(normalize(query).encode('utf-8')).hexdigest()[:16]
+
+
+def _record(query, **values):
+    """
+    Add measures to the metrics of a query.
+    """
+    key = fingerprint(query)
+    with _metrics_lock:
+        measures = _metrics.get(key)
+        if measures is None:
+            measures = {'query': normalize(query), 'executions': 0, 'execute_duration': 0., 'max_execute_duration': 0.,
+                        'calls': 0, 'duration': 0., 'max_duration': 0., 'first_row_duration': 0., 'rows': 0, 'bytes': 0}
+            _metrics[key] = measures
+
+        for name, value in values.items():
+            if name.startswith('max_'):
+                measures[name] = max(measures[name], value)
+            else:
+                measures[name] += value
+
+
+def query_metrics():
+    """
+    Return the measures of the executed queries.
+
+    :return dict: {fingerprint: {query, executions, execute_duration, max_execute_duration,
+        calls, duration, max_duration, first_row_duration, rows, bytes}}
+
+    executions and execute_duration are measured on the engines for each statement.
+    calls, durations, rows and bytes are measured by the request functions.
+    """
+    with _metrics_lock:
+        return {key: dict(measures) for key, measures in _metrics.items()}
+
+
+def reset_metrics():
+    """
+    Forget the measures of the executed queries.
+    """
+    with _metrics_lock:
+        _metrics.clear()
+
+
+def instrument(engine):
+    """
+    Record the execution time of each statement of the engine.
+
+    The execution time approximates the time to the first row.
+    Statements executed outside of request functions are logged when slower than slow_query_threshold.
+    """
+    @sqlalchemy.event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    @sqlalchemy.event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info['query_start_time'].pop()
+        _record(statement, executions=1, execute_duration=duration,
+                max_execute_duration=duration)
+        if duration > slow_query_threshold and not getattr(_local, 'depth', 0):
+            logger.warning('slow_query', extra={
+                           'fingerprint': fingerprint(statement), 'query': normalize(statement), 'duration': duration})
+
+
+class QueryMeasure:
+    """
+    Context measuring the results of a query executed by a request function.
+
+    :param str query: executed query
+
+    Only the time spent in fetch blocks is measured, not the time spent by the caller on the results.
+    Result frames are given to add, their size is approximated by their shallow memory usage.
+    The measures are recorded at the exit of the context.
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.duration = 0.
+        self.rows = 0
+        self.bytes = 0
+        self.first_row_duration = None
+
+    def __enter__(self):
+        return self
+
+    @contextlib.contextmanager
+    def fetch(self):
+        """
+        Measure the time spent executing the query or fetching results.
+        """
+        _local.depth = getattr(_local, 'depth', 0) + 1
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.duration += time.perf_counter() - start_time
+            _local.depth -= 1
+
+    def iterate(self, chunks):
+        """
+        Yield and measure the frames of chunks, the time spent by the caller between frames being excluded.
+        """
+        chunks = iter(chunks)
+        while True:
+            with self.fetch():
+                frame = next(chunks, None)
+            if frame is None:
+                return
+            self.add(frame)
+            yield frame
+
+    def add(self, frame):
+        if self.first_row_duration is None:
+            self.first_row_duration = self.duration
+        self.rows += len(frame)
+        self.bytes += int(frame.memory_usage(index=False).sum())
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = self.duration
+        _record(self.query, calls=1, duration=duration, max_duration=duration,
+                first_row_duration=self.first_row_duration or duration,
+                rows=self.rows, bytes=self.bytes)
+
+        if duration > slow_query_threshold:
+            logger.warning('slow_query', extra={
+                'fingerprint': fingerprint(self.query), 'query': normalize(self.query),
+                'duration': duration, 'first_row_duration': self.first_row_duration,
+                'rows': self.rows, 'bytes': self.bytes})
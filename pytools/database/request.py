@@ -1,12 +1,365 @@
+import collections
+import concurrent.futures
+import functools
+import io
+import logging
+import os
+import time
+
 import pandas as pd
+import sqlalchemy
 import string
 
+from . import connector
+from . import instrument
+
+logger = logging.getLogger(__name__)
+
 
-def request_from_file(filename, engine, template_args={}):
+def read_query(filename, template_args={}):
     """
-    return the Dataframe resulting in executing the content of the filename
+    Return the content of the filename with the template arguments substituted
+
+    Parsed templates are cached until the modification of the file.
     """
+    return _template(str(filename), os.stat(str(filename)).st_mtime_ns).substitute(**template_args)
+
+
+@functools.lru_cache(maxsize=256)
+def _template(filename, mtime):
     with open(filename) as rq:
-        query = string.Template(rq.read()).substitute(**template_args)
-        frame = pd.read_sql(query, engine)
-        return frame
+        return string.Template(rq.read())
+
+
+def get_statement(filename, template_args={}):
+    """
+    Return the sqlalchemy statement of the content of the filename.
+
+    :param str filename: sql file, values are given as bound parameters (:name)
+    :param dict template_args: arguments substituted in the file, e.g. table or column names
+
+    Statements are cached by rendered query, so that executing the same file
+    with other parameters reuses the same statement and query plan.
+    """
+    return _statement(read_query(filename, template_args))
+
+
+@functools.lru_cache(maxsize=256)
+def _statement(query):
+    return sqlalchemy.text(query)
+
+
+def request_from_file(filename, engine, template_args={}, cache=None, base=None, params=None):
+    """
+    return the Dataframe resulting in executing the content of the filename
+
+    :param QueryCache cache: cache of the results (default=None=no cache)
+    :param str base: identifier of the base in the cache (default=None=engine url)
+    :param dict params: values of the bound parameters (:name) of the file
+
+    The template arguments should only be used for identifiers, values being passed as params.
+    Results which can not be cached are returned with a warning.
+    """
+    query = read_query(filename, template_args)
+    statement = query if params is None else _statement(query)
+    if cache is None:
+        return _measured_read_sql(query, statement, engine, params)
+
+    base = base if base is not None else str(getattr(engine, 'url', engine))
+    cache_query = query if params is None else '{}\n-- {!r}'.format(query, sorted(params.items()))
+    frame = cache.get(cache_query, base)
+    if frame is None:
+        frame = _measured_read_sql(query, statement, engine, params)
+        try:
+            cache.put(cache_query, base, frame)
+        except Exception as exc:
+            logger.warning('cache_put', extra={'filename': str(filename), 'error': repr(exc)})
+    return frame
+
+
+def _measured_read_sql(query, statement, engine, params):
+    with instrument.QueryMeasure(query) as measure:
+        with measure.fetch():
+            frame = pd.read_sql(statement, engine, params=params)
+        measure.add(frame)
+    return frame
+
+
+def request_chunks_from_file(filename, engine, chunksize=100000, template_args={}, dtype=None, params=None):
+    """
+    Yield the result of executing the content of the filename by chunks of DataFrames.
+
+    :param str filename: sql file
+    :param engine: engine returned by connector.get_engine
+    :param int chunksize: number of rows of each chunk
+    :param dict template_args: arguments substituted in the file
+    :param dict dtype: dtype to apply to columns {column: dtype} (default=None=inferred)
+    :param dict params: values of the bound parameters (:name) of the file
+
+    When the backend supports it (PostgreSQL), a server side cursor is used
+    so that the client never holds the full result set.
+    """
+    query = read_query(filename, template_args)
+    statement = query if params is None else _statement(query)
+
+    stream = getattr(getattr(engine, 'dialect', None),
+                     'supports_server_side_cursors', False)
+    connection = (engine.connect().execution_options(stream_results=True)
+                  if stream else engine)
+
+    try:
+        with instrument.QueryMeasure(query) as measure:
+            with measure.fetch():
+                chunks = pd.read_sql(statement, connection, chunksize=chunksize, params=params)
+            for chunk in measure.iterate(chunks):
+                if dtype:
+                    chunk = chunk.astype(dtype)
+                yield chunk
+    finally:
+        if stream:
+            connection.close()
+
+
+def request_many(jobs, max_workers=8, base_limits={}, config_directory=connector.default_config_directory, **kwargs):
+    """
+    Execute concurrently independent sql files.
+
+    :param jobs: list of (sql file, base, template arguments), or dict {name: (sql file, base, template arguments)}
+    :param int max_workers: maximum number of queries running at once
+    :param dict base_limits: maximum number of queries running at once on a base {base: limit}
+    :param str config_directory: directory of the bases configurations
+    :param kwargs: arguments of request_from_file (e.g. cache)
+
+    :return tuple: (results, timings) dicts keyed by job name (or position in the list).
+        A result is the DataFrame or the exception raised by the job.
+        A timing gives the waiting time before the start of the query and the duration of the query.
+
+    Jobs are started in order, skipping the jobs of the bases which reached their limit,
+    so that a limited base never holds the workers needed by the other bases.
+    Engines are shared through connector.get_engine.
+    """
+    if max_workers < 1:
+        raise RuntimeError('max_workers must be positive : {}'.format(max_workers))
+    for base, limit in base_limits.items():
+        if limit < 1:
+            raise RuntimeError('Limit of base {} must be positive : {}'.format(base, limit))
+
+    items = list(jobs.items() if isinstance(jobs, dict) else enumerate(jobs))
+    start_time = time.perf_counter()
+
+    def run(job):
+        filename, base, template_args = job
+        query_time = time.perf_counter()
+        try:
+            result = request_from_file(filename, connector.get_engine(base, config_directory),
+                                       template_args, **kwargs)
+        except Exception as exc:
+            logger.warning('request_many', extra={
+                           'filename': str(filename), 'base': base, 'error': repr(exc)})
+            result = exc
+        end_time = time.perf_counter()
+        return result, {'wait': query_time - start_time, 'duration': end_time - query_time}
+
+    outputs = [None] * len(items)
+    pending = list(range(len(items)))
+    running = {}
+    active = collections.Counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            waiting = []
+            for position in pending:
+                base = items[position][1][1]
+                if len(running) < max_workers and active[base] < base_limits.get(base, max_workers):
+                    running[executor.submit(run, items[position][1])] = position
+                    active[base] += 1
+                else:
+                    waiting.append(position)
+            pending = waiting
+
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                position = running.pop(future)
+                active[items[position][1][1]] -= 1
+                outputs[position] = future.result()
+
+    results = {name: output[0] for (name, _), output in zip(items, outputs)}
+    timings = {name: output[1] for (name, _), output in zip(items, outputs)}
+    return results, timings
+
+
+def load_frame(frame, table, engine, mode='append', key=None, chunksize=10000):
+    """
+    Bulk load a DataFrame into a table.
+
+    :param DataFrame frame: data to load, its index is not loaded
+    :param str table: name of the target table
+    :param engine: engine returned by connector.get_engine
+    :param str mode: 'append', 'replace' (recreate the table) or 'upsert' (update the rows with existing key)
+    :param list key: columns of the unique key used by upsert
+    :param int chunksize: number of rows sent at once
+
+    :return dict: number of rows, duration and rows per second of the loading
+
+    Missing tables are created from the frame dtypes, with a unique index on key if given.
+    PostgreSQL tables are filled with COPY FROM STDIN, MSSQL tables with the
+    pymssql bulk copy and other databases with executemany, committing each chunk.
+    """
+    if mode not in ['append', 'replace', 'upsert']:
+        raise RuntimeError('Unknown loading mode : {}'.format(mode))
+    if isinstance(key, str):
+        key = [key]
+    if mode == 'upsert' and not key:
+        raise RuntimeError('Need key for upsert')
+
+    start_time = time.perf_counter()
+    frame = frame.reset_index(drop=True)
+    _prepare_table(frame, table, engine, mode, key)
+
+    loaders = {'postgresql': _copy_postgresql, 'mssql': _bulk_copy_mssql}
+    loader = loaders.get(engine.dialect.name, _executemany)
+    loader(frame, table, engine, key if mode == 'upsert' else None, chunksize)
+
+    duration = time.perf_counter() - start_time
+    stats = {'table': table, 'rows': len(frame), 'duration': duration,
+             'rows_per_second': len(frame) / duration if duration else None}
+    logger.info('load_frame', extra=stats)
+    return stats
+
+
+def _prepare_table(frame, table, engine, mode, key):
+    """
+    Create the table if missing or replaced.
+    """
+    with engine.connect() as connection:
+        exists = engine.dialect.has_table(connection, table)
+    if exists and mode != 'replace':
+        return
+
+    frame.head(0).to_sql(table, engine, if_exists='replace', index=False)
+    if key:
+        quote = engine.dialect.identifier_preparer.quote
+        with engine.begin() as connection:
+            connection.execute(sqlalchemy.text('CREATE UNIQUE INDEX {} ON {} ({})'.format(
+                quote('ix_{}_{}'.format(table, '_'.join(key))), quote(table),
+                ', '.join(map(quote, key)))))
+
+
+def _chunks(frame, chunksize):
+    for start in range(0, len(frame), chunksize):
+        yield frame.iloc[start:start+chunksize]
+
+
+def _rows(chunk):
+    """
+    Return the rows of a chunk as tuples of python objects, missing values being None.
+    """
+    chunk = chunk.astype(object).where(chunk.notnull(), None)
+    return list(chunk.itertuples(index=False, name=None))
+
+
+def _upsert_clause(columns, key, quote):
+    """
+    Return the ON CONFLICT clause of PostgreSQL and SQLite.
+    """
+    updated = [c for c in columns if c not in key]
+    action = ('DO UPDATE SET ' + ', '.join('{0} = excluded.{0}'.format(quote(c)) for c in updated)
+              if updated else 'DO NOTHING')
+    return ' ON CONFLICT ({}) {}'.format(', '.join(map(quote, key)), action)
+
+
+def _executemany(frame, table, engine, key, chunksize):
+    """
+    Insert the rows with executemany, one transaction per chunk.
+    """
+    quote = engine.dialect.identifier_preparer.quote
+    placeholder = '?' if engine.dialect.paramstyle == 'qmark' else '%s'
+    query = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(table), ', '.join(map(quote, frame.columns)), ', '.join([placeholder] * len(frame.columns)))
+    if key:
+        query += _upsert_clause(frame.columns, key, quote)
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for chunk in _chunks(frame, chunksize):
+            cursor.executemany(query, _rows(chunk))
+            connection.commit()
+    finally:
+        connection.close()
+
+
+def _copy_postgresql(frame, table, engine, key, chunksize):
+    """
+    Stream the rows with COPY FROM STDIN from in-memory csv buffers, in a single transaction.
+
+    Upserted rows are copied in a temporary table and then merged into the table.
+    """
+    quote = engine.dialect.identifier_preparer.quote
+    columns = ', '.join(map(quote, frame.columns))
+    target = quote(table)
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if key:
+            target = quote('tmp_' + table)
+            cursor.execute('CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP'
+                           .format(target, quote(table)))
+
+        copy = "COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '\\N')".format(target, columns)
+        for chunk in _chunks(frame, chunksize):
+            buffer = io.StringIO()
+            chunk.to_csv(buffer, index=False, header=False, na_rep='\\N')
+            buffer.seek(0)
+            cursor.copy_expert(copy, buffer)
+
+        if key:
+            cursor.execute('INSERT INTO {} ({}) SELECT {} FROM {}'.format(quote(table), columns, columns, target)
+                           + _upsert_clause(frame.columns, key, quote))
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def _bulk_copy_mssql(frame, table, engine, key, chunksize):
+    """
+    Send the rows with the bulk copy of pymssql.
+
+    Drivers without bulk copy (pymssql before 2.2) insert the rows with executemany.
+    Upserted rows are copied in a staging table and then merged into the table.
+    """
+    quote = engine.dialect.identifier_preparer.quote
+    target = ('#' + table) if key else table
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if key:
+            cursor.execute('SELECT TOP 0 * INTO {} FROM {}'.format(quote(target), quote(table)))
+
+        if hasattr(connection, 'bulk_copy'):
+            table_columns = [c['name'] for c in sqlalchemy.inspect(engine).get_columns(table)]
+            column_ids = [table_columns.index(c) + 1 for c in frame.columns]
+            for chunk in _chunks(frame, chunksize):
+                connection.bulk_copy(target, _rows(chunk), column_ids=column_ids)
+        else:
+            placeholder = '?' if engine.dialect.paramstyle == 'qmark' else '%s'
+            query = 'INSERT INTO {} ({}) VALUES ({})'.format(
+                quote(target), ', '.join(map(quote, frame.columns)), ', '.join([placeholder] * len(frame.columns)))
+            for chunk in _chunks(frame, chunksize):
+                cursor.executemany(query, _rows(chunk))
+
+        if key:
+            updated = [c for c in frame.columns if c not in key]
+            cursor.execute(
+                'MERGE {table} AS t USING {target} AS s ON {on} '
+                '{update}WHEN NOT MATCHED THEN INSERT ({columns}) VALUES ({values});'.format(
+                    table=quote(table), target=quote(target),
+                    on=' AND '.join('t.{0} = s.{0}'.format(quote(c)) for c in key),
+                    update=('WHEN MATCHED THEN UPDATE SET {} '.format(
+                        ', '.join('t.{0} = s.{0}'.format(quote(c)) for c in updated)) if updated else ''),
+                    columns=', '.join(map(quote, frame.columns)),
+                    values=', '.join('s.' + quote(c) for c in frame.columns)))
+        connection.commit()
+    finally:
+        connection.close()
@@ -1,3 +1,7 @@
+import io
+import os
+import pathlib
+import tempfile
 import unittest
 import pandas as pd
 import numpy as np
@@ -41,3 +45,133 @@ class TestMissingValuesColumns(unittest.TestCase):
                                 columns=['missing_values', 'missing_values_perct'])
 
         pd.util.testing.assert_frame_equal(output, expected)
+
+
+class TestUnivariatePlot(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.TemporaryDirectory()
+        rng = np.random.RandomState(0)
+        self.frame = pd.DataFrame({'col0': rng.normal(size=100),
+                                   'col1': rng.normal(size=100),
+                                   'target': rng.randint(2, size=100)})
+
+    def tearDown(self):
+        self.outdir.cleanup()
+
+    def test_parallel(self):
+        outdir = pathlib.Path(self.outdir.name)
+        manifest = eda.univariate_plot(
+            self.frame, outdir, 'target', True, n_jobs=2, sample=50)
+
+        self.assertEqual(list(manifest['column']), list(self.frame.columns))
+        for filename in manifest['file']:
+            self.assertTrue(os.path.exists(filename))
+        self.assertTrue((manifest['duration'] > 0).all())
+
+
+class TestChunkedDescription(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.frame = pd.DataFrame({'col0': rng.normal(size=1000),
+                                   'col1': rng.randint(50, size=1000).astype(float),
+                                   'col2': rng.randint(2, size=1000),
+                                   'col3': ['a']*1000,
+                                   'target': rng.randint(2, size=1000)})
+        self.frame.loc[::7, 'col1'] = np.nan
+
+    def test_same_as_description(self):
+        with tempfile.TemporaryDirectory() as outdir:
+            expected = eda.description(self.frame, pathlib.Path(outdir), 'target')
+        chunks = (self.frame.iloc[i:i+300] for i in range(0, 1000, 300))
+        output = eda.chunked_description(chunks, None, 'target')
+
+        self.assertEqual(list(output.columns), list(expected.columns))
+        self.assertEqual(list(output.index), list(expected.index))
+        exact_cols = ['count', 'mean', 'std', 'min', 'max', 'dtype', 'missing_values',
+                      'fraction_missing', 'p_value_target']
+        pd.testing.assert_frame_equal(output.loc[:, exact_cols], expected.loc[:, exact_cols],
+                                      check_dtype=False)
+        np.testing.assert_allclose(output.loc[:, ['25%', '50%', '75%']].values.astype(float),
+                                   expected.loc[:, ['25%', '50%', '75%']].values.astype(float))
+        np.testing.assert_allclose(output['nunique'], expected['nunique'], rtol=0.02)
+
+    def test_hyperloglog(self):
+        hll = eda.HyperLogLog()
+        for i in range(10):
+            hll.update(np.arange(i*10000, (i+2)*10000))
+        self.assertAlmostEqual(hll.cardinality() / 110000, 1, delta=0.03)
+
+    def test_dtype_change(self):
+        csv = io.StringIO('col0,col1,target\n1,,0\n2,,1\n3,a,0\n4,b,1\n')
+        frame = pd.read_csv(csv)
+        csv.seek(0)
+
+        output = eda.chunked_description(pd.read_csv(csv, chunksize=2), None, 'target')
+
+        self.assertEqual(list(output.index), ['col0', 'target'])
+        with tempfile.TemporaryDirectory() as outdir:
+            expected = eda.description(frame, pathlib.Path(outdir), 'target')
+        pd.testing.assert_frame_equal(output.loc[:, ['count', 'mean', 'min', 'max']],
+                                      expected.loc[:, ['count', 'mean', 'min', 'max']], check_dtype=False)
+
+
+class TestBatchChi2(unittest.TestCase):
+    def test_same_as_chi2_indep(self):
+        rng = np.random.RandomState(0)
+        frame = pd.DataFrame({'col{}'.format(i): rng.randint(2, size=200)
+                              for i in range(5)})
+        frame['col1'] = frame['col1'].map({0: 'a', 1: 'b'})
+        frame.loc[::9, 'col2'] = np.nan
+        frame['col3'] = frame['col0']
+        columns = list(frame.columns)
+
+        for target in [rng.randint(2, size=200), rng.randint(4, size=200)]:
+            frame['target'] = target
+            output = eda.batch_chi2_indep(frame, columns, 'target')
+            expected = [eda.chi2_indep(frame.loc[:, [col, 'target']])
+                        for col in columns]
+            np.testing.assert_allclose(output.values, expected)
+
+    def test_non_binary(self):
+        frame = pd.DataFrame({'col0': [0, 1, 2], 'target': [0, 1, 1]})
+        with self.assertRaises(RuntimeError):
+            eda.batch_chi2_indep(frame, ['col0'], 'target')
+
+
+class TestBlockedCorrelation(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        values = rng.normal(size=(200, 7))
+        values[:, 1] += 2 * values[:, 0]
+        values[:, 5] -= values[:, 3]
+        values[rng.rand(200, 7) < 0.1] = np.nan
+        self.frame = pd.DataFrame(values, columns=['col{}'.format(i) for i in range(7)])
+        self.frame['col7'] = 'a'
+
+    def test_same_as_corr(self):
+        expected = self.frame.drop(columns='col7').corr()
+        with tempfile.TemporaryDirectory() as outdir:
+            filename = os.path.join(outdir, 'corr.npy')
+            output = eda.blocked_correlation(self.frame, block_size=3, filename=filename)
+            np.testing.assert_allclose(output.values, expected.values, atol=1e-5)
+            np.testing.assert_allclose(np.load(filename), expected.values, atol=1e-5)
+        self.assertEqual(list(output.columns), list(expected.columns))
+
+    def test_top_correlations(self):
+        output = eda.top_correlations(self.frame, k=2, block_size=3)
+        self.assertEqual(list(zip(output['var0'], output['var1'])), [
+                         ('col0', 'col1'), ('col3', 'col5')])
+        self.assertAlmostEqual(output['correlation'][0],
+                               self.frame['col0'].corr(self.frame['col1']), 5)
+
+    def test_target_correlation(self):
+        output = eda.target_correlation(self.frame, 'col1', block_size=4)
+        expected = self.frame.drop(columns='col7').corr()['col1'].drop('col1')
+        np.testing.assert_allclose(output.values, expected.values, atol=1e-5)
+        self.assertEqual(list(output.index), list(expected.index))
+
+    def test_heatmap_downsample(self):
+        with tempfile.TemporaryDirectory() as outdir:
+            eda.get_correlation(self.frame.drop(columns='col7'), pathlib.Path(outdir),
+                                block_size=3, max_heatmap=3)
+            self.assertTrue(os.path.exists(os.path.join(outdir, 'correlation.png')))
@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 
 import numpy as np
@@ -48,6 +50,73 @@ class TestMeanEncoding(unittest.TestCase):
             feateng.stat_encoding(self.frame, category=['col1'], agg=[])
 
 
+class TestStatEncoder(unittest.TestCase):
+
+    def setUp(self):
+        self.frame = pd.DataFrame([[1, 2, 3], [1, 1, 3], [1, 4, 5], [1, 5, 5], [2, 6, 1], [
+                                  2, 2, 1], [2, 8, 3], [2, 12, 3]], columns=['col0', 'col1', 'col2'])
+        self.batch = pd.DataFrame([[2, 1], [3, 3], [1, 5]], columns=[
+                                  'col0', 'col2'], index=[5, 2, 9])
+
+    def test_same_as_stat_encoding(self):
+        encoder = feateng.StatEncoder(['col0', 'col2']).fit(self.frame)
+        expected = pd.merge(self.frame.loc[:, ['col0', 'col2']], feateng.stat_encoding(
+            self.frame, category=['col0', 'col2']), on=['col0', 'col2']).drop(columns=['col0', 'col2'])
+
+        output = encoder.transform(self.frame)
+
+        pd.util.testing.assert_frame_equal(output, expected)
+
+    def test_fallbacks(self):
+        output = feateng.StatEncoder(['col0', 'col2'], agg='mean').fit(
+            self.frame).transform(self.batch)
+        np.testing.assert_array_equal(output['col1_mean'], [4, np.nan, 4.5])
+        self.assertEqual(list(output.index), [5, 2, 9])
+
+        output = feateng.StatEncoder('col0', agg='mean', fallback='global').fit(
+            self.frame.loc[:, ['col0', 'col1']]).transform(self.batch)
+        np.testing.assert_array_equal(output['col1_mean'], [7, 5, 3])
+
+        output = feateng.StatEncoder('col2', agg='mean', fallback={'col1_mean': -1}).fit(
+            self.frame.loc[:, ['col1', 'col2']]).transform(pd.DataFrame({'col2': [0, 5]}))
+        np.testing.assert_array_equal(output['col1_mean'], [-1, 4.5])
+
+    def test_save_load(self):
+        encoder = feateng.StatEncoder('col0', prefix='p_').fit(self.frame)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'encoder.pkl')
+            encoder.save(filename)
+            loaded = feateng.StatEncoder.load(filename)
+
+        pd.util.testing.assert_frame_equal(
+            loaded.transform(self.batch), encoder.transform(self.batch))
+
+
+class TestFloatToStr(unittest.TestCase):
+
+    def setUp(self):
+        self.serie = pd.Series([1., np.nan, 12.7, 1., -3.], index=[3, 1, 2, 0, 4], name='ids')
+
+    def test_standard(self):
+        expected = self.serie.apply(
+            lambda x: np.nan if pd.isna(x) else str(int(x))).astype(str)
+        pd.util.testing.assert_series_equal(feateng.float_to_str(self.serie), expected)
+
+    def test_missing(self):
+        output = feateng.float_to_str(self.serie, na_value=None)
+        self.assertEqual(list(output.values[[0, 2, 3, 4]]), ['1', '12', '1', '-3'])
+        self.assertTrue(pd.isna(output.values[1]))
+
+    def test_category(self):
+        output = feateng.float_to_str(self.serie, as_category=True)
+        self.assertEqual(output.dtype.name, 'category')
+        self.assertEqual(list(output), ['1', 'nan', '12', '1', '-3'])
+
+        output = feateng.float_to_str(self.serie, na_value=None, as_category=True)
+        self.assertEqual(sorted(output.cat.categories), ['-3', '1', '12'])
+        self.assertTrue(pd.isna(output.iloc[1]))
+
+
 class TestAddGroupFeatures(unittest.TestCase):
 
     def test_standard(self):
@@ -133,6 +202,52 @@ class TestAddGroupFeatures(unittest.TestCase):
 
         pd.util.testing.assert_frame_equal(added_frame, expected)
 
+    def test_unsorted_index(self):
+        frame = pd.DataFrame([[2, 1]
+                              , [1, 2]
+                              , [np.nan, 5]
+                              , [2, 4]]
+                             , columns=['cat', 'col0']
+                             , index=[7, 3, 5, 1])
+
+        added_frame = feateng.group_features(frame, ['cat'], {'col0': sum})
+
+        expected = pd.DataFrame([[5.], [2], [np.nan], [5]]
+                                , columns=['col0_sum']
+                                , index=[7, 3, 5, 1])
+
+        pd.util.testing.assert_frame_equal(added_frame, expected)
+
+    def test_observed_categorical(self):
+        frame = pd.DataFrame({'cat0': pd.Categorical(['a', 'b', 'a'], categories=list('abcd'))
+                              , 'cat1': pd.Categorical(['x', 'y', 'x'], categories=list('xyzw'))
+                              , 'col0': [1, 2, 3]})
+
+        added_frame = feateng.group_features(
+            frame, ['cat0', 'cat1'], {'col0': 'sum'}, observed=True)
+
+        expected = pd.DataFrame([[4], [2], [4]], columns=['col0_sum'])
+
+        pd.util.testing.assert_frame_equal(added_frame, expected)
+
+    def test_unobserved_categorical(self):
+        frame = pd.DataFrame({'cat0': pd.Categorical(['x', 'y', 'x', np.nan], categories=['w', 'x', 'y'])
+                              , 'cat1': pd.Categorical(['p', 'p', 'q', 'p'])
+                              , 'col0': [1, 2, 3, 4]})
+
+        added_frame = feateng.group_features(frame, ['cat0', 'cat1'], {'col0': 'sum'})
+
+        expected = pd.DataFrame([[1.], [2], [3], [np.nan]], columns=['col0_sum'])
+
+        pd.util.testing.assert_frame_equal(added_frame, expected)
+
+        added_frame = feateng.group_features(frame, ['cat0'], {'col0': 'sum'})
+
+        expected = pd.DataFrame([[4.], [2], [4], [np.nan]], columns=['col0_sum'])
+
+        pd.util.testing.assert_frame_equal(added_frame, expected)
+
+
 class TestCheckFrameColumns(unittest.TestCase):
     def test_all_ok(self):
         frame = pd.DataFrame(np.arange(4).reshape(
@@ -259,6 +374,29 @@ class TestMultiDateFeatures(unittest.TestCase):
         with self.assertRaises(RuntimeError) :
             feateng.multi_date_features( df, date_cols=['col0'], levels=[])
 
+    def test_nat_tz_float32(self):
+        df = pd.DataFrame({'col0': [pd.Timestamp('2018-12-18 07:10:10'), pd.NaT]})
+        df['col1'] = df['col0'].dt.tz_localize('Europe/Paris')
+
+        out_df = feateng.multi_date_features(
+            df, date_cols=['col0', 'col1'], levels=['hour'], dtype=np.float32)
+
+        self.assertTrue((out_df.dtypes == np.float32).all())
+        np.testing.assert_almost_equal(out_df.iloc[0].values, [
+                                       7, -0.258819, 0.965926]*2, 5)
+        self.assertTrue(out_df.iloc[1].isnull().all())
+
+    def test_same_as_scalar(self):
+        df = pd.DataFrame({'col0': pd.date_range(
+            '2018-12-18 07:10:10', periods=50, freq='37H')})
+        levels = ['month', 'dayofweek', 'hourmin',
+                  'weekhour', 'hour', 'dayofyear']
+
+        out_df = feateng.multi_date_features(df, 'col0', levels)
+        expected = [feateng.date_features(x, levels) for x in df['col0']]
+
+        np.testing.assert_almost_equal(out_df.values, expected)
+
 class TestGetSingleValCols(unittest.TestCase):
     def setUp(self):
         pass
@@ -288,6 +426,30 @@ class TestGetSingleValCols(unittest.TestCase):
 
         self.assertEqual(len(cols), 0)
 
+    def test_blocks(self):
+        df = pd.DataFrame({'col0': [1.]*10 + [2.],
+                           'col1': [np.nan]*5 + ['a']*6,
+                           'col2': pd.Categorical(['b']*11)})
+
+        cols = feateng.single_val_cols(df, block_size=3)
+
+        self.assertEqual(list(cols), ['col1', 'col2'])
+
+    def test_chunks(self):
+        def chunks():
+            yield pd.DataFrame([[1, np.nan, 1], [1, np.nan, 2]], columns=['col0', 'col1', 'col2'])
+            yield pd.DataFrame([[2, 3, 1]], columns=['col0', 'col1', 'col2'])
+            yield pd.DataFrame([[1, 4, 1]], columns=['col0', 'col1', 'col2'])
+            raise RuntimeError('Chunks read after all columns were dropped')
+
+        cols = feateng.single_val_cols(chunks())
+
+        self.assertEqual(len(cols), 0)
+
+        cols = feateng.single_val_cols(iter([pd.DataFrame([[1, 2], [1, 3]], columns=['col0', 'col1']),
+                                             pd.DataFrame([[1, 3]], columns=['col0', 'col1'])]))
+        self.assertEqual(list(cols), ['col0'])
+
 class TestGroupCumulative(unittest.TestCase):
     def setUp(self):
         pass
@@ -326,3 +488,19 @@ class TestGroupCumulative(unittest.TestCase):
         output = feateng.group_cumulative(inputs, group='group0', values='val0')
 
         pd.util.testing.assert_frame_equal(expected, output)
+
+    def test_unsorted_negative(self):
+        inputs = pd.DataFrame([[1, 2.]
+                               , [0, -1]
+                               , [1, -5]
+                               , [0, 3]
+                               , [1, 1]]
+                              , columns=['group0', 'val0']
+                              , index=[10, 4, 7, 2, 0])
+        expected = pd.DataFrame([[2.], [-1], [-3], [2], [-2]]
+                                , columns=['val0']
+                                , index=[10, 4, 7, 2, 0])
+
+        output = feateng.group_cumulative(inputs, group='group0', values='val0')
+
+        pd.util.testing.assert_frame_equal(expected, output)
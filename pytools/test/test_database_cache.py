@@ -0,0 +1,98 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+from ..database import cache
+from ..database import request
+
+
+class TestQueryCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.frame = pd.DataFrame(
+            {'col0': np.arange(10), 'col1': list('abcdefghij')})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_put_get(self):
+        for fmt in ['feather', 'parquet']:
+            query_cache = cache.QueryCache(self.directory.name, fmt=fmt)
+            self.assertIsNone(query_cache.get('select 1', 'base'))
+
+            query_cache.put('select 1', 'base', self.frame)
+            pd.testing.assert_frame_equal(
+                query_cache.get('select 1', 'base'), self.frame)
+            self.assertIsNone(query_cache.get('select 1', 'other_base'))
+
+    def test_unknown_format(self):
+        with self.assertRaises(RuntimeError):
+            cache.QueryCache(self.directory.name, fmt='pickle')
+
+    def test_ttl(self):
+        query_cache = cache.QueryCache(self.directory.name, ttl=0)
+        query_cache.put('select 1', 'base', self.frame)
+        time.sleep(0.01)
+        self.assertIsNone(query_cache.get('select 1', 'base'))
+
+    def test_invalidate(self):
+        query_cache = cache.QueryCache(self.directory.name)
+        query_cache.put('select 1', 'base', self.frame)
+        query_cache.put('select 2', 'base', self.frame)
+
+        query_cache.invalidate('select 1', 'base')
+        self.assertIsNone(query_cache.get('select 1', 'base'))
+        self.assertIsNotNone(query_cache.get('select 2', 'base'))
+
+        query_cache.invalidate()
+        self.assertIsNone(query_cache.get('select 2', 'base'))
+
+    def test_lru_eviction(self):
+        query_cache = cache.QueryCache(self.directory.name)
+        query_cache.put('select 1', 'base', self.frame)
+        size = query_cache.path('select 1', 'base').stat().st_size
+        query_cache.max_size = 2 * size
+
+        query_cache.put('select 2', 'base', self.frame)
+        os.utime(str(query_cache.path('select 2', 'base')), (0, 0))
+        query_cache.put('select 3', 'base', self.frame)
+
+        self.assertIsNotNone(query_cache.get('select 1', 'base'))
+        self.assertIsNone(query_cache.get('select 2', 'base'))
+        self.assertIsNotNone(query_cache.get('select 3', 'base'))
+
+    def test_request_from_file(self):
+        engine = sqlalchemy.create_engine('sqlite://')
+        self.frame.to_sql('test_table', engine, index=False)
+        query_cache = cache.QueryCache(self.directory.name)
+
+        filename = os.path.join(self.directory.name, 'request.sql')
+        with open(filename, 'w') as sql_file:
+            sql_file.write('select * from test_table')
+
+        request.request_from_file(filename, engine, cache=query_cache)
+        engine.execute('drop table test_table')
+
+        output = request.request_from_file(filename, engine, cache=query_cache)
+        pd.testing.assert_frame_equal(output, self.frame)
+
+    def test_put_failure(self):
+        engine = sqlalchemy.create_engine('sqlite://')
+        query_cache = cache.QueryCache(self.directory.name)
+
+        filename = os.path.join(self.directory.name, 'request.sql')
+        with open(filename, 'w') as sql_file:
+            sql_file.write("select 1 as col0 union all select 'a'")
+
+        with mock.patch.object(request.logger, 'warning') as warning:
+            output = request.request_from_file(filename, engine, cache=query_cache)
+
+        self.assertEqual(list(output['col0']), [1, 'a'])
+        warning.assert_called_once()
+        self.assertEqual(os.listdir(self.directory.name), ['request.sql'])
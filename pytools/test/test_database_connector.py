@@ -1,6 +1,7 @@
 import json
 import os
 import sys
+import tempfile
 import unittest
 
 from .. import ROOT_DIRECTORY
@@ -28,3 +29,42 @@ class TestGetConfig(unittest.TestCase):
             'valid_json_format', self.test_data_path)
         self.assertEqual(len(label0_data), 2)
         self.assertEqual(label0_data['label0'], 'value0')
+
+    def test_cache_invalidation(self):
+        with tempfile.TemporaryDirectory() as config_directory:
+            config_filename = os.path.join(config_directory, 'base.json')
+            with open(config_filename, 'w') as config_file:
+                json.dump({'label0': 'value0'}, config_file)
+            self.assertEqual(connector.get_config(
+                'base', config_directory), {'label0': 'value0'})
+
+            with open(config_filename, 'w') as config_file:
+                json.dump({'label0': 'value1', 'label1': 'value1'}, config_file)
+            self.assertEqual(connector.get_config('base', config_directory), {
+                             'label0': 'value1', 'label1': 'value1'})
+
+    def test_load_all(self):
+        bases = connector.load_all(self.test_data_path)
+        self.assertIn('valid_json_format', bases)
+        self.assertNotIn('wrong_json_format', bases)
+
+
+class TestGetEngine(unittest.TestCase):
+    def setUp(self):
+        self.test_data_path = ROOT_DIRECTORY/'data'/'test'
+
+    def tearDown(self):
+        connector.dispose_all()
+
+    def test_shared_engine(self):
+        engine = connector.get_engine('sqlite_memory', self.test_data_path)
+        self.assertIs(engine, connector.get_engine(
+            'sqlite_memory', self.test_data_path))
+        self.assertIsNot(engine, connector.create_engine(
+            'sqlite_memory', self.test_data_path))
+
+    def test_dispose_all(self):
+        engine = connector.get_engine('sqlite_memory', self.test_data_path)
+        connector.dispose_all()
+        self.assertIsNot(engine, connector.get_engine(
+            'sqlite_memory', self.test_data_path))
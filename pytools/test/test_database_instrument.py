@@ -0,0 +1,90 @@
+import json
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from ..database import connector
+from ..database import instrument
+from ..database import request
+
+
+class TestNormalize(unittest.TestCase):
+    def test_values(self):
+        self.assertEqual(instrument.normalize("SELECT *  FROM t -- comment\nWHERE a = 'x''y' AND b IN (1, 2.5, 3);"),
+                         'select * from t where a = ? and b in (?)')
+
+    def test_bound_parameters(self):
+        queries = ['select * from t2 where a >= :threshold', 'select * from t2 where a >= ?',
+                   'select * from t2 where a >= %(threshold)s', 'select * from t2 where a >= 10']
+        self.assertEqual(len(set(map(instrument.fingerprint, queries))), 1)
+        self.assertEqual(instrument.normalize('select a::int from t'), 'select a::int from t')
+
+
+class TestQueryMetrics(unittest.TestCase):
+    def setUp(self):
+        instrument.reset_metrics()
+        self.directory = tempfile.TemporaryDirectory()
+        path = self.directory.name
+        with open(path + '/base.json', 'w') as config_file:
+            json.dump({'driver': '{SQLite3 ODBC Driver}', 'database': path + '/base.db'}, config_file)
+        self.engine = connector.get_engine('base', path)
+        pd.DataFrame({'col0': np.arange(10)}).to_sql('test_table', self.engine, index=False)
+
+        self.filename = path + '/request.sql'
+        with open(self.filename, 'w') as sql_file:
+            sql_file.write('select * from test_table where col0 >= $threshold')
+
+    def tearDown(self):
+        connector.dispose_all()
+        instrument.reset_metrics()
+        self.directory.cleanup()
+
+    def test_aggregation(self):
+        for threshold in [2, 5]:
+            request.request_from_file(self.filename, self.engine, {'threshold': threshold})
+        list(request.request_chunks_from_file(self.filename, self.engine, chunksize=2,
+                                              template_args={'threshold': 9}))
+
+        measures = instrument.query_metrics()[instrument.fingerprint(
+            'select * from test_table where col0 >= 0')]
+        self.assertEqual(measures['calls'], 3)
+        self.assertEqual(measures['executions'], 3)
+        self.assertEqual(measures['rows'], 8 + 5 + 1)
+        self.assertEqual(measures['bytes'], 8 * 14)
+        self.assertGreaterEqual(measures['duration'], measures['first_row_duration'])
+
+    def test_slow_query(self):
+        with mock.patch.object(instrument, 'slow_query_threshold', 0), \
+                mock.patch.object(instrument, 'logger') as logger:
+            request.request_from_file(self.filename, self.engine, {'threshold': 2})
+            self.engine.execute('select 1')
+
+        self.assertEqual(logger.warning.call_count, 2)
+        self.assertEqual(logger.warning.call_args_list[0][1]['extra']['rows'], 8)
+        self.assertEqual(logger.warning.call_args_list[1][1]['extra']['query'], 'select ?')
+
+    def test_consumer_time(self):
+        with mock.patch.object(instrument, 'slow_query_threshold', 0.1), \
+                mock.patch.object(instrument, 'logger') as logger:
+            for chunk in request.request_chunks_from_file(self.filename, self.engine, chunksize=4,
+                                                          template_args={'threshold': 0}):
+                time.sleep(0.05)
+
+        logger.warning.assert_not_called()
+        measures = instrument.query_metrics()[instrument.fingerprint(
+            'select * from test_table where col0 >= 0')]
+        self.assertLess(measures['duration'], 0.1)
+
+        chunks = request.request_chunks_from_file(self.filename, self.engine, chunksize=4,
+                                                  template_args={'threshold': 0})
+        next(chunks)
+        with mock.patch.object(instrument, 'slow_query_threshold', 0), \
+                mock.patch.object(instrument, 'logger') as logger:
+            self.engine.execute('select 1')
+        chunks.close()
+
+        self.assertEqual(logger.warning.call_count, 1)
@@ -0,0 +1,277 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.mssql import pymssql as mssql_pymssql
+
+from ..database import connector
+from ..database import request
+
+
+class TestRequestFromFile(unittest.TestCase):
+    def setUp(self):
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        self.frame = pd.DataFrame({'col0': np.arange(10), 'col1': list('abcdefghij')})
+        self.frame.to_sql('test_table', self.engine, index=False)
+
+        fd, self.filename = tempfile.mkstemp(suffix='.sql')
+        with os.fdopen(fd, 'w') as sql_file:
+            sql_file.write('select * from $table')
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_standard(self):
+        output = request.request_from_file(
+            self.filename, self.engine, {'table': 'test_table'})
+        pd.testing.assert_frame_equal(output, self.frame)
+
+    def test_chunks(self):
+        chunks = list(request.request_chunks_from_file(
+            self.filename, self.engine, chunksize=4, template_args={'table': 'test_table'}))
+
+        self.assertEqual([len(c) for c in chunks], [4, 4, 2])
+        pd.testing.assert_frame_equal(
+            pd.concat(chunks, ignore_index=True), self.frame)
+
+    def test_chunks_dtype(self):
+        chunks = request.request_chunks_from_file(
+            self.filename, self.engine, chunksize=4,
+            template_args={'table': 'test_table'}, dtype={'col0': np.float32})
+
+        for chunk in chunks:
+            self.assertEqual(chunk['col0'].dtype, np.float32)
+
+    def test_params(self):
+        with open(self.filename, 'w') as sql_file:
+            sql_file.write('select * from $table where col0 >= :threshold')
+
+        for threshold in [3, 8]:
+            output = request.request_from_file(self.filename, self.engine, {'table': 'test_table'},
+                                               params={'threshold': threshold})
+            pd.testing.assert_frame_equal(output, self.frame[self.frame['col0'] >= threshold]
+                                          .reset_index(drop=True))
+
+        chunks = request.request_chunks_from_file(self.filename, self.engine, chunksize=2,
+                                                  template_args={'table': 'test_table'},
+                                                  params={'threshold': 5})
+        self.assertEqual(sum(len(c) for c in chunks), 5)
+
+    def test_statement_cache(self):
+        statement = request.get_statement(self.filename, {'table': 'test_table'})
+        self.assertIs(statement, request.get_statement(self.filename, {'table': 'test_table'}))
+        self.assertIsNot(statement, request.get_statement(self.filename, {'table': 'other_table'}))
+
+        with open(self.filename, 'w') as sql_file:
+            sql_file.write('select col0 from $table')
+        os.utime(self.filename, ns=(0, 0))
+        self.assertEqual(str(request.get_statement(self.filename, {'table': 'test_table'})),
+                         'select col0 from test_table')
+
+    def test_equal_template_args(self):
+        with open(self.filename, 'w') as sql_file:
+            sql_file.write('select * from t where v >= $v')
+
+        self.assertEqual([request.read_query(self.filename, {'v': v}) for v in [1, 1.0, True]],
+                         ['select * from t where v >= 1', 'select * from t where v >= 1.0',
+                          'select * from t where v >= True'])
+
+
+class TestLoadFrame(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = sqlalchemy.create_engine(
+            'sqlite:///{}/test.db'.format(self.directory.name))
+        self.frame = pd.DataFrame({'col0': np.arange(10), 'col1': list('abcdefghij'),
+                                   'col2': np.arange(10.)})
+        self.frame.loc[3, 'col2'] = np.nan
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def read_table(self):
+        return pd.read_sql('select * from test_table order by col0', self.engine)
+
+    def test_append_replace(self):
+        stats = request.load_frame(self.frame, 'test_table', self.engine, chunksize=3)
+        self.assertEqual(stats['rows'], 10)
+        pd.testing.assert_frame_equal(self.read_table(), self.frame)
+
+        request.load_frame(self.frame, 'test_table', self.engine)
+        self.assertEqual(len(self.read_table()), 20)
+
+        request.load_frame(self.frame.iloc[:2], 'test_table', self.engine, mode='replace')
+        pd.testing.assert_frame_equal(self.read_table(), self.frame.iloc[:2])
+
+    def test_upsert(self):
+        request.load_frame(self.frame.iloc[:6], 'test_table', self.engine, mode='upsert', key='col0')
+        updated = self.frame.copy()
+        updated['col1'] = updated['col1'].str.upper()
+
+        request.load_frame(updated.iloc[4:], 'test_table', self.engine,
+                           mode='upsert', key=['col0'], chunksize=4)
+
+        expected = pd.concat([self.frame.iloc[:4], updated.iloc[4:]])
+        pd.testing.assert_frame_equal(self.read_table(), expected)
+
+    def test_errors(self):
+        with self.assertRaises(RuntimeError):
+            request.load_frame(self.frame, 'test_table', self.engine, mode='upsert')
+        with self.assertRaises(RuntimeError):
+            request.load_frame(self.frame, 'test_table', self.engine, mode='merge')
+
+
+class TestLoadFramePostgresql(unittest.TestCase):
+    def setUp(self):
+        self.frame = pd.DataFrame({'col0': np.arange(5), 'col1': list('abcde'),
+                                   'col2': np.arange(5.)})
+        self.frame.loc[3, 'col2'] = np.nan
+
+        self.engine = mock.Mock()
+        self.engine.dialect = postgresql.dialect()
+        self.connection = self.engine.raw_connection.return_value
+        self.cursor = self.connection.cursor.return_value
+
+        # the buffers are read at the call as they are discarded afterwards
+        self.buffers = []
+        self.cursor.copy_expert.side_effect = lambda query, buffer: self.buffers.append(buffer.read())
+
+        patcher = mock.patch.object(request, '_prepare_table')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_copy(self):
+        request.load_frame(self.frame, 'test_table', self.engine, chunksize=3)
+
+        copy = "COPY test_table (col0, col1, col2) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+        self.assertEqual([c[0][0] for c in self.cursor.copy_expert.call_args_list], [copy, copy])
+        self.assertEqual(self.buffers, ['0,a,0.0\n1,b,1.0\n2,c,2.0\n', '3,d,\\N\n4,e,4.0\n'])
+        self.cursor.execute.assert_not_called()
+        self.connection.commit.assert_called_once_with()
+        self.connection.close.assert_called_once_with()
+
+    def test_upsert(self):
+        request.load_frame(self.frame, 'test_table', self.engine, mode='upsert', key='col0')
+
+        self.assertEqual([c[0][0] for c in self.cursor.execute.call_args_list], [
+            'CREATE TEMP TABLE tmp_test_table (LIKE test_table INCLUDING DEFAULTS) ON COMMIT DROP',
+            'INSERT INTO test_table (col0, col1, col2) SELECT col0, col1, col2 FROM tmp_test_table'
+            ' ON CONFLICT (col0) DO UPDATE SET col1 = excluded.col1, col2 = excluded.col2'])
+        self.assertEqual(self.cursor.copy_expert.call_args[0][0],
+                         "COPY tmp_test_table (col0, col1, col2) FROM STDIN WITH (FORMAT csv, NULL '\\N')")
+        self.assertEqual(len(self.buffers), 1)
+        self.connection.commit.assert_called_once_with()
+
+
+class TestLoadFrameMssql(unittest.TestCase):
+    def setUp(self):
+        self.frame = pd.DataFrame({'col0': np.arange(5), 'col1': list('abcde'),
+                                   'col2': np.arange(5.)})
+        self.frame.loc[3, 'col2'] = np.nan
+
+        self.engine = mock.Mock()
+        self.engine.dialect = mssql_pymssql.dialect()
+
+        patcher = mock.patch.object(request, '_prepare_table')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bulk_copy(self):
+        connection = self.engine.raw_connection.return_value
+        with mock.patch('sqlalchemy.inspect') as inspect:
+            inspect.return_value.get_columns.return_value = [{'name': 'col2'}, {'name': 'col0'}, {'name': 'col1'}]
+            request.load_frame(self.frame, 'test_table', self.engine, chunksize=3)
+
+        self.assertEqual(connection.bulk_copy.call_args_list, [
+            mock.call('test_table', [(0, 'a', 0.), (1, 'b', 1.), (2, 'c', 2.)], column_ids=[2, 3, 1]),
+            mock.call('test_table', [(3, 'd', None), (4, 'e', 4.)], column_ids=[2, 3, 1])])
+        connection.commit.assert_called_once_with()
+
+    def test_executemany_upsert(self):
+        connection = mock.Mock(spec=['cursor', 'commit', 'close'])
+        self.engine.raw_connection.return_value = connection
+        cursor = connection.cursor.return_value
+
+        request.load_frame(self.frame, 'test_table', self.engine, mode='upsert', key='col0', chunksize=3)
+
+        self.assertEqual(cursor.executemany.call_count, 2)
+        self.assertEqual(cursor.executemany.call_args[0], (
+            'INSERT INTO [#test_table] (col0, col1, col2) VALUES (%s, %s, %s)', [(3, 'd', None), (4, 'e', 4.)]))
+        self.assertEqual([c[0][0] for c in cursor.execute.call_args_list], [
+            'SELECT TOP 0 * INTO [#test_table] FROM test_table',
+            'MERGE test_table AS t USING [#test_table] AS s ON t.col0 = s.col0 '
+            'WHEN MATCHED THEN UPDATE SET t.col1 = s.col1, t.col2 = s.col2 '
+            'WHEN NOT MATCHED THEN INSERT (col0, col1, col2) VALUES (s.col0, s.col1, s.col2);'])
+        connection.commit.assert_called_once_with()
+
+
+class TestRequestMany(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = self.directory.name
+        for i in range(2):
+            with open('{}/base{}.json'.format(path, i), 'w') as config_file:
+                json.dump({'driver': '{SQLite3 ODBC Driver}',
+                           'database': '{}/base{}.db'.format(path, i)}, config_file)
+            engine = sqlalchemy.create_engine('sqlite:///{}/base{}.db'.format(path, i))
+            pd.DataFrame({'col0': np.arange(5) + 10 * i}).to_sql('test_table', engine, index=False)
+            engine.dispose()
+
+        self.filename = path + '/request.sql'
+        with open(self.filename, 'w') as sql_file:
+            sql_file.write('select * from $table')
+
+    def tearDown(self):
+        connector.dispose_all()
+        self.directory.cleanup()
+
+    def test_standard(self):
+        jobs = {'first': (self.filename, 'base0', {'table': 'test_table'}),
+                'second': (self.filename, 'base1', {'table': 'test_table'}),
+                'wrong': (self.filename, 'base1', {'table': 'wrong_table'})}
+
+        results, timings = request.request_many(
+            jobs, max_workers=3, base_limits={'base1': 1}, config_directory=self.directory.name)
+
+        self.assertEqual(list(results['first']['col0']), list(range(5)))
+        self.assertEqual(list(results['second']['col0']), list(range(10, 15)))
+        self.assertIsInstance(results['wrong'], Exception)
+        self.assertEqual(sorted(timings), ['first', 'second', 'wrong'])
+        self.assertGreaterEqual(timings['first']['duration'], 0)
+
+    def test_list(self):
+        jobs = [(self.filename, 'base0', {'table': 'test_table'})] * 3
+
+        results, timings = request.request_many(jobs, config_directory=self.directory.name)
+
+        self.assertEqual(sorted(results), [0, 1, 2])
+
+    def test_limited_base_first(self):
+        def slow_request(filename, engine, template_args):
+            time.sleep(0.2 if engine == 'base1' else 0)
+            return engine
+
+        jobs = {i: (self.filename, 'base1', {}) for i in range(3)}
+        jobs['other'] = (self.filename, 'base0', {})
+        with mock.patch.object(request, 'request_from_file', side_effect=slow_request), \
+                mock.patch.object(connector, 'get_engine', side_effect=lambda base, directory: base):
+            results, timings = request.request_many(jobs, max_workers=2, base_limits={'base1': 1})
+
+        self.assertEqual(results, {0: 'base1', 1: 'base1', 2: 'base1', 'other': 'base0'})
+        self.assertLess(timings['other']['wait'], 0.1)
+        self.assertGreater(timings[2]['wait'], 0.3)
+
+    def test_wrong_limits(self):
+        jobs = [(self.filename, 'base0', {'table': 'test_table'})]
+        with self.assertRaises(RuntimeError):
+            request.request_many(jobs, base_limits={'base0': 0}, config_directory=self.directory.name)
+        with self.assertRaises(RuntimeError):
+            request.request_many(jobs, max_workers=0, config_directory=self.directory.name)
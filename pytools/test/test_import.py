@@ -0,0 +1,37 @@
+import subprocess
+import sys
+import unittest
+
+from .. import ROOT_DIRECTORY
+
+# Print the heavy modules loaded and the pytools handlers after an import
+check_script = """
+import sys
+import {module}
+import pytools
+print(sorted(m for m in ('matplotlib', 'seaborn', 'scipy', 'pymssql', 'logmatic') if m in sys.modules))
+print([type(h).__name__ for h in pytools.logger.handlers])
+"""
+
+
+class TestImport(unittest.TestCase):
+    def run_import(self, module):
+        output = subprocess.run([sys.executable, '-c', check_script.format(module=module)],
+                                cwd=str(ROOT_DIRECTORY), stdout=subprocess.PIPE,
+                                universal_newlines=True, check=True).stdout.split('\n')
+        return eval(output[0]), eval(output[1])
+
+    def test_connector(self):
+        modules, handlers = self.run_import('pytools.database.connector')
+        self.assertEqual(modules, [])
+        self.assertEqual(handlers, ['NullHandler'])
+
+    def test_data_science(self):
+        modules, handlers = self.run_import(
+            'pytools.data_science.eda, pytools.data_science.features_engineering')
+        self.assertEqual(modules, [])
+
+    def test_lazy_subpackage(self):
+        modules, handlers = self.run_import(
+            'pytools; assert pytools.database.__name__ == "pytools.database"')
+        self.assertEqual(modules, [])
@@ -0,0 +1,61 @@
+import json
+import logging
+import multiprocessing
+import queue
+import tempfile
+import unittest
+
+from .. import BoundedQueueHandler, define_logger, stop_logging
+
+
+def log_from_worker(log_queue):
+    worker_logger = logging.getLogger('test_logger_worker')
+    worker_logger.setLevel(logging.DEBUG)
+    define_logger(worker_logger, log_queue=log_queue)
+    worker_logger.info('worker_record')
+
+
+class TestBackgroundLogger(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.NOTSET)
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.logger = logging.getLogger('test_logger_' + self.id())
+        self.logger.setLevel(logging.DEBUG)
+
+    def tearDown(self):
+        logging.disable(logging.CRITICAL)
+        stop_logging()
+        self.logger.handlers = []
+        self.log_dir.cleanup()
+
+    def read_messages(self):
+        with open(self.log_dir.name + '/happytal_libpython.log') as log_file:
+            return [json.loads(line)['message'] for line in log_file]
+
+    def test_flush_at_stop(self):
+        define_logger(self.logger, background=True, block=True, log_dir=self.log_dir.name)
+        for i in range(100):
+            self.logger.debug('record', extra={'i': i})
+        stop_logging()
+
+        self.assertEqual(self.read_messages(), ['record'] * 100)
+
+    def test_drop_when_full(self):
+        handler = BoundedQueueHandler(queue.Queue(2))
+        self.logger.addHandler(handler)
+        for i in range(5):
+            self.logger.info('record')
+
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+
+    def test_multiprocess(self):
+        log_queue = define_logger(self.logger, background=True, multiprocess=True,
+                                  block=True, log_dir=self.log_dir.name)
+        worker = multiprocessing.Process(target=log_from_worker, args=(log_queue,))
+        worker.start()
+        worker.join()
+        self.logger.info('parent_record')
+        stop_logging()
+
+        self.assertEqual(sorted(self.read_messages()), ['parent_record', 'worker_record'])
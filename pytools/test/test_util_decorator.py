@@ -0,0 +1,53 @@
+import unittest
+from unittest import mock
+
+from ..util import decorator
+
+
+class TestTrackerProfile(unittest.TestCase):
+    def setUp(self):
+        decorator.reset()
+
+    def tearDown(self):
+        decorator.reset()
+
+    def test_stats(self):
+        @decorator.tracker(profile=True)
+        def square(x):
+            return x**2
+
+        self.assertEqual([square(x) for x in range(5)], [0, 1, 4, 9, 16])
+
+        measures = decorator.stats()[square.__module__ + '.' + square.__qualname__]
+        self.assertEqual(measures['calls'], 5)
+        self.assertEqual(measures['timed_calls'], 5)
+        self.assertEqual(sum(measures['histogram']), 5)
+        self.assertLessEqual(measures['min_duration'], measures['mean_duration'])
+        self.assertLessEqual(measures['mean_duration'], measures['max_duration'])
+
+        decorator.reset()
+        self.assertEqual(decorator.stats(), {})
+
+    def test_sampling(self):
+        @decorator.tracker(profile=True, sample_rate=0)
+        def identity(x):
+            return x
+
+        identity(1)
+
+        measures = decorator.stats()[identity.__module__ + '.' + identity.__qualname__]
+        self.assertEqual(measures['calls'], 1)
+        self.assertEqual(measures['timed_calls'], 0)
+        self.assertIsNone(measures['mean_duration'])
+
+    def test_flush(self):
+        ulogger = mock.Mock()
+
+        @decorator.tracker(profile=True, ulogger=ulogger, flush_interval=0)
+        def identity(x):
+            return x
+
+        identity(1)
+
+        ulogger.info.assert_called_once()
+        self.assertEqual(ulogger.info.call_args[1]['extra']['calls'], 1)
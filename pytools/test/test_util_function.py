@@ -1,7 +1,11 @@
 import os
+import pathlib
 import sys
+import tempfile
 import unittest
+from unittest import mock
 import numpy as np
+import pandas as pd
 
 from ..util import function as ft
 from .. import ROOT_DIRECTORY
@@ -26,6 +30,47 @@ class TestWindow(unittest.TestCase):
         sequences = [x for x in ft.window([])]
         self.assertEqual(sequences, [])
 
+    def test_step(self):
+        sequences = [list(x) for x in ft.window(iter(self.test_sequence), 2, step=2)]
+        self.assertEqual(sequences, [[0, 1], [2, 3]])
+
+        sequences = [list(x) for x in ft.window(self.test_sequence, 2, step=3)]
+        self.assertEqual(sequences, [[0, 1], [3, 4]])
+
+    def test_partial(self):
+        sequences = [list(x) for x in ft.window(self.test_sequence, 3, step=2, partial=True)]
+        self.assertEqual(sequences, [[0, 1, 2], [2, 3, 4], [4]])
+
+        sequences = [list(x) for x in ft.window(self.test_sequence, 10, partial=True)]
+        self.assertEqual(sequences[:2], [[0, 1, 2, 3, 4], [1, 2, 3, 4]])
+
+    def test_shared(self):
+        windows = ft.window(self.test_sequence, 3, shared=True)
+        first = next(windows)
+        self.assertEqual(list(first), [0, 1, 2])
+        self.assertIs(next(windows), first)
+        self.assertEqual([list(x) for x in ft.window(self.test_sequence, 3, step=2, shared=True)],
+                         [[0, 1, 2], [2, 3, 4]])
+
+    def test_wrong_step(self):
+        with self.assertRaises(RuntimeError):
+            list(ft.window(self.test_sequence, 2, step=0))
+
+
+class TestStridedWindow(unittest.TestCase):
+    def test_same_as_window(self):
+        array = np.arange(10)
+        for n, step in [(2, 1), (3, 2), (4, 5), (11, 1)]:
+            expected = [list(x) for x in ft.window(array, n, step=step)]
+            self.assertEqual(ft.strided_window(array, n, step).tolist(), expected)
+
+    def test_zero_copy(self):
+        serie = pd.Series(np.arange(10.))
+        windows = ft.strided_window(serie, 3)
+        self.assertEqual(windows.shape, (8, 3))
+        self.assertTrue(np.shares_memory(windows, serie.values))
+        np.testing.assert_array_equal(windows.mean(axis=1), np.arange(1., 9.))
+
 
 class TestMultiReplace(unittest.TestCase):
 
@@ -54,3 +99,128 @@ class TestMultiReplace(unittest.TestCase):
     def test_empty_input(self):
         replaced = ft.multi_replace('', {'a': 'b'})
         self.assertEqual(replaced, '')
+
+
+class TestMultiReplacer(unittest.TestCase):
+    def setUp(self):
+        self.replacements = {'aaa': 'ddd', 'aa': 'ee', 'ab': 'f', 'abc': 'g', 'b.': 'h'}
+        self.strings = ['aaa bbb ccc', 'aab abc', 'a.b b. bc', '']
+
+    def test_trie_same_as_regex(self):
+        replacer = ft.MultiReplacer(self.replacements)
+        trie_replacer = ft.MultiReplacer(self.replacements, trie_threshold=1)
+        for string in self.strings:
+            self.assertEqual(replacer(string), trie_replacer(string))
+        self.assertEqual(trie_replacer('aab abc'), 'eeb g')
+
+    def test_replace_all(self):
+        replacer = ft.MultiReplacer(self.replacements)
+        strings = pd.Series(self.strings + [np.nan], index=list('vwxyz'))
+
+        output = replacer.replace_all(strings)
+
+        expected = pd.Series([replacer(x) for x in self.strings] + [np.nan], index=list('vwxyz'))
+        pd.testing.assert_series_equal(output, expected)
+        self.assertEqual(replacer.replace_all(iter(self.strings)),
+                         [replacer(x) for x in self.strings])
+
+    def test_separator_in_keys(self):
+        replacer = ft.MultiReplacer({'a\x00': 'b'})
+        self.assertEqual(replacer.replace_all(['a\x00a', 'c']), ['ba', 'c'])
+
+        replacer = ft.MultiReplacer({'a': 'A'})
+        self.assertEqual(replacer.replace_all(['x\x00a', 'b', 'a']), ['x\x00A', 'b', 'A'])
+
+
+class TestSpreadsheet(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.directory.name)
+        self.frame = pd.DataFrame({'col0': np.arange(5), 'col1': list('abcde'), 'col2': np.arange(5.)})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_columnar(self):
+        self.frame.to_parquet(str(self.path/'data.parquet'))
+        self.frame.to_feather(str(self.path/'data.feather'))
+
+        for filename in ['data.parquet', 'data.feather']:
+            pd.testing.assert_frame_equal(ft.spreadsheet(self.path/filename), self.frame)
+            pd.testing.assert_frame_equal(ft.spreadsheet(self.path/filename, columns=['col2', 'col0']),
+                                          self.frame.loc[:, ['col2', 'col0']])
+
+    def test_csv_cache(self):
+        filename = self.path/'data.csv'
+        self.frame.to_csv(str(filename), index=False)
+
+        output = ft.spreadsheet(filename, cache=True)
+        pd.testing.assert_frame_equal(output, self.frame)
+        self.assertEqual(len(list(self.path.glob('.data.csv.*.feather'))), 1)
+
+        output = ft.spreadsheet(filename, cache=True, columns=['col1'])
+        pd.testing.assert_frame_equal(output, self.frame.loc[:, ['col1']])
+
+        output = ft.spreadsheet(filename, cache=True, index_col='col1')
+        pd.testing.assert_frame_equal(output, self.frame.set_index('col1'))
+        self.assertEqual(len(list(self.path.glob('.data.csv.*.feather'))), 2)
+
+        self.frame.iloc[:2].to_csv(str(filename), index=False)
+        output = ft.spreadsheet(filename, cache=True)
+        pd.testing.assert_frame_equal(output, self.frame.iloc[:2])
+        self.assertEqual(len(list(self.path.glob('.data.csv.*.feather'))), 2)
+
+    def test_cache_failure(self):
+        filename = self.path/'data.csv'
+        self.frame.to_csv(str(filename), index=False)
+        converters = {'col1': lambda x: 0 if x == 'a' else x}
+
+        with mock.patch.object(ft.logger, 'warning') as warning:
+            output = ft.spreadsheet(filename, cache=True, converters=converters)
+
+        self.assertEqual(list(output['col1']), [0, 'b', 'c', 'd', 'e'])
+        warning.assert_called_once()
+        self.assertEqual(list(self.path.glob('*.feather')), [])
+
+
+class TestWriteDf(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.directory.name)
+        self.frames = [pd.DataFrame({'col0': np.arange(10) * i, 'col1': list('abcdefghij')})
+                       for i in range(3)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_csv(self):
+        filenames = ft.write_df(self.frames, self.path/'out.csv', names=['first'])
+
+        self.assertEqual([f.name for f in filenames], [
+                         'out_first.csv', 'out_sheet1.csv', 'out_sheet2.csv'])
+        for frame, filename in zip(self.frames, filenames):
+            pd.testing.assert_frame_equal(pd.read_csv(str(filename), index_col=0), frame)
+
+    def test_single_frame(self):
+        filenames = ft.write_df(self.frames[1], self.path/'out.csv.gz', compression='gzip', chunksize=3)
+
+        self.assertEqual(filenames, [self.path/'out.csv.gz'])
+        pd.testing.assert_frame_equal(pd.read_csv(str(filenames[0]), index_col=0), self.frames[1])
+
+    def test_columnar(self):
+        for suffix, compression in [('.parquet', 'gzip'), ('.feather', 'zstd')]:
+            filenames = ft.write_df(self.frames, self.path/('out' + suffix), names=['a', 'b', 'c'],
+                                    n_jobs=2, compression=compression, chunksize=4)
+            for frame, filename in zip(self.frames, filenames):
+                pd.testing.assert_frame_equal(ft.spreadsheet(filename), frame)
+
+    def test_missing_first_chunk(self):
+        frame = pd.DataFrame({'col0': [None] * 4 + ['x', 'y']})
+        for suffix in ['.parquet', '.feather']:
+            filenames = ft.write_df(frame, self.path/('out' + suffix), chunksize=4)
+            pd.testing.assert_frame_equal(ft.spreadsheet(filenames[0]), frame)
+
+    def test_atomic(self):
+        with self.assertRaises(Exception):
+            ft.write_df(pd.DataFrame({'col0': [1, 'a']}), self.path/'out.parquet')
+        self.assertEqual(list(self.path.iterdir()), [])
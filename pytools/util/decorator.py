@@ -1,8 +1,19 @@
+import bisect
 import functools
+import random
+import threading
 import time
 
 from .. import logger
 
+# Upper bounds in seconds of the latency histogram buckets, the last bucket is unbounded
+latency_buckets = [1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1, 10, 100]
+
+# Aggregated measures of the profiled functions {function: measures}
+_profiles = {}
+_profiles_lock = threading.Lock()
+_last_flush = time.perf_counter()
+
 
 def debug(func):
     """Print the function signature and return value"""
@@ -18,8 +29,17 @@ def debug(func):
     return wrapper_debug
 
 
-def tracker(_func=None, *, ulogger=None):
-    """Log the trace of the program"""
+def tracker(_func=None, *, ulogger=None, profile=False, sample_rate=1., flush_interval=None):
+    """Log the trace of the program
+
+    :param Logger ulogger: logger used instead of the pytools logger
+    :param bool profile: aggregate the calls in memory instead of logging each of them
+    :param float sample_rate: fraction of the profiled calls which are timed
+    :param float flush_interval: minimum number of seconds between two summaries logged by profiled calls (default=None=never)
+
+    In profile mode, arguments and returned values are never logged.
+    Call counts and latency histograms are available through stats.
+    """
     def decorator_tracker(func)	:
         @functools.wraps(func)
         def wrapper_logger(*args, **kwargs):
@@ -33,9 +53,91 @@ def tracker(_func=None, *, ulogger=None):
                                    **kwargs, 'function': func.__name__, 'value': value,  'duration': run_time})
             return value
 
-        return wrapper_logger
+        name = '{}.{}'.format(func.__module__, func.__qualname__)
+
+        @functools.wraps(func)
+        def wrapper_profiler(*args, **kwargs):
+            if sample_rate < 1 and random.random() >= sample_rate:
+                value = func(*args, **kwargs)
+                _record(name, None)
+            else:
+                start_time = time.perf_counter()
+                value = func(*args, **kwargs)
+                _record(name, time.perf_counter() - start_time)
+
+            if flush_interval is not None and time.perf_counter() - _last_flush > flush_interval:
+                flush(ulogger)
+            return value
+
+        return wrapper_profiler if profile else wrapper_logger
 
     if _func is None:
         return decorator_tracker
     else:
         return decorator_tracker(_func)
+
+
+def _record(name, duration):
+    """
+    Add a call of a profiled function, with its duration if timed.
+    """
+    with _profiles_lock:
+        measures = _profiles.get(name)
+        if measures is None:
+            measures = {'calls': 0, 'timed_calls': 0, 'total_duration': 0.,
+                        'min_duration': None, 'max_duration': None,
+                        'histogram': [0] * (len(latency_buckets) + 1)}
+            _profiles[name] = measures
+
+        measures['calls'] += 1
+        if duration is None:
+            return
+        measures['timed_calls'] += 1
+        measures['total_duration'] += duration
+        measures['min_duration'] = (duration if measures['min_duration'] is None
+                                    else min(duration, measures['min_duration']))
+        measures['max_duration'] = (duration if measures['max_duration'] is None
+                                    else max(duration, measures['max_duration']))
+        measures['histogram'][bisect.bisect_left(latency_buckets, duration)] += 1
+
+
+def stats():
+    """
+    Return the measures of the profiled functions.
+
+    :return dict: {function: {calls, timed_calls, total_duration, mean_duration, min_duration, max_duration, histogram}}
+
+    The histogram counts the timed calls in each bucket of latency_buckets.
+    """
+    with _profiles_lock:
+        measures = {name: dict(m, histogram=list(m['histogram']))
+                    for name, m in _profiles.items()}
+
+    for m in measures.values():
+        m['mean_duration'] = (m['total_duration'] / m['timed_calls']
+                              if m['timed_calls'] else None)
+    return measures
+
+
+def reset():
+    """
+    Forget the measures of the profiled functions.
+    """
+    global _last_flush
+    with _profiles_lock:
+        _profiles.clear()
+        _last_flush = time.perf_counter()
+
+
+def flush(ulogger=None):
+    """
+    Log the summary of the profiled functions.
+
+    :param Logger ulogger: logger used instead of the pytools logger
+    """
+    global _last_flush
+    _last_flush = time.perf_counter()
+
+    effective_logger = ulogger if ulogger is not None else logger
+    for name, measures in stats().items():
+        effective_logger.info('profile', extra={'function': name, **measures})
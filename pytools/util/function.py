@@ -1,17 +1,36 @@
+import collections
+import concurrent.futures
+import contextlib
+import functools
+import hashlib
 import itertools
+import logging
+import os
+import pathlib
 import re
+import numpy as np
 import pandas as pd
 
+logger = logging.getLogger(__name__)
 
-def window(seq, n=2):
+
+def window(seq, n=2, step=1, partial=False, shared=False):
     """
     Returns a sliding window (of width n) over data from the iterable
 
     :param list seq: sequence from which to extract subsequences
     :param int n: number of elements to extract at each iteration
+    :param int step: number of elements between the starts of two windows
+    :param bool partial: wether to return the trailing windows shorter than n
+    :param bool shared: yield the same deque, updated in place, instead of a new tuple for each window
 
     If sequence is smaller than required window width, return empty string
 
+    Each window is copied in a new tuple of n elements.
+    With shared, moving the window costs O(step) but the yielded deque must not be modified
+    and must be copied to be kept after the next iteration.
+    For numpy arrays and Series, strided_window returns all windows without copy.
+
     :Example:
 
     ```
@@ -19,13 +38,61 @@ def window(seq, n=2):
     ```
 
     """
-    it = iter(seq)
-    result = tuple(itertools.islice(it, n))
-    if len(result) == n:
-        yield result
-    for elem in it:
-        result = result[1:] + (elem,)
-        yield result
+    if step < 1:
+        raise RuntimeError('window step must be positive : {}'.format(step))
+
+    if step == 1 and not partial and not shared:
+        it = iter(seq)
+        result = tuple(itertools.islice(it, n))
+        if len(result) == n:
+            yield result
+        for elem in it:
+            result = result[1:] + (elem,)
+            yield result
+        return
+
+    result = collections.deque()
+    output = (lambda x: x) if shared else tuple
+    skip = 0
+    for elem in seq:
+        if skip:
+            skip -= 1
+            continue
+        result.append(elem)
+        if len(result) == n:
+            yield output(result)
+            for _ in range(min(step, n)):
+                result.popleft()
+            skip = max(step - n, 0)
+
+    while partial and result:
+        yield output(result)
+        for _ in range(min(step, len(result))):
+            result.popleft()
+
+
+def strided_window(array, n=2, step=1):
+    """
+    Returns a read-only view of all the sliding windows (of width n) over an array
+
+    :param ndarray array: numpy array or Series, windows are taken along the first axis
+    :param int n: number of elements in each window
+    :param int step: number of elements between the starts of two windows
+
+    :return ndarray: array of shape (number of windows, n, ...) sharing the memory of array
+
+    :Example:
+
+    ```
+    strided_window(np.arange(5), 3).mean(axis=1) # -> [1, 2, 3]
+    ```
+    """
+    array = np.asarray(array)
+    n_windows = max((len(array) - n) // step + 1, 0)
+    shape = (n_windows, n) + array.shape[1:]
+    strides = (array.strides[0] * step,) + array.strides
+
+    return np.lib.stride_tricks.as_strided(array, shape=shape, strides=strides, writeable=False)
 
 
 def multi_replace(string, replacements):
@@ -37,62 +104,289 @@ def multi_replace(string, replacements):
     :return: modified string
     :rtype: str
 
-    This code is an adaptation of : https://gist.github.com/bgusach/a967e0587d6e01e889fd1d776c5f3729
+    The compiled replacers of the last used replacement maps are cached.
+    For repeated calls with the same map, use directly a MultiReplacer.
     """
     if not len(replacements):
         return string
 
-    # Place longer ones first to keep shorter substrings from matching where the longer ones should take place
-    # For instance given the replacements {'ab': 'AB', 'abc': 'ABC'} against the string 'hey abc', it should produce
-    # 'hey ABC' and not 'hey ABc'
-    substrs = sorted(replacements, key=len, reverse=True)
+    return cached_replacer(frozenset(replacements.items()))(string)
+
+
+@functools.lru_cache(maxsize=32)
+def cached_replacer(items):
+    """
+    Return the MultiReplacer of a frozenset of (value to find, value to replace) items.
+    """
+    return MultiReplacer(dict(items))
+
+
+class MultiReplacer:
+    """Compiled replacement map applied to strings or columns of strings.
+
+    :param dict replacements: replacement dictionary {value to find: value to replace}
+    :param int trie_threshold: number of keys above which the pattern is built as a trie
+
+    The longest key is replaced when several keys match at the same position.
+
+    Large maps are compiled as a trie so that the regex engine walks the keys
+    character by character, like an Aho-Corasick automaton, instead of
+    trying every alternative at every position.
+
+    This code is an adaptation of : https://gist.github.com/bgusach/a967e0587d6e01e889fd1d776c5f3729
+    """
+
+    def __init__(self, replacements, trie_threshold=1000):
+        self.replacements = dict(replacements)
+        if not len(self.replacements):
+            self.regexp = None
+        elif len(self.replacements) < trie_threshold:
+            # Place longer ones first to keep shorter substrings from matching where the longer ones should take place
+            # For instance given the replacements {'ab': 'AB', 'abc': 'ABC'} against the string 'hey abc', it should produce
+            # 'hey ABC' and not 'hey ABc'
+            substrs = sorted(self.replacements, key=len, reverse=True)
+
+            # Create a big OR regex that matches any of the substrings to replace
+            self.regexp = re.compile('|'.join(map(re.escape, substrs)))
+        else:
+            self.regexp = re.compile(trie_pattern(self.replacements))
+
+    def __call__(self, string):
+        if self.regexp is None:
+            return string
+
+        # For each match, look up the new string in the replacements
+        return self.regexp.sub(lambda match: self.replacements[match.group(0)], string)
+
+    def replace_all(self, strings):
+        """
+        Apply the replacements to a Series or an iterable of strings.
+
+        Non string elements (e.g. NaN) are left untouched.
+        A Series is returned with the same index for a Series input, a list otherwise.
+
+        The strings are joined with a separator absent from the replacement map and from the strings
+        so that a single regex pass processes the whole column.
+        """
+        values = list(strings)
+        positions = [i for i, val in enumerate(values) if isinstance(val, str)]
+
+        separator = '\x00'
+        if any(separator in x for x in itertools.chain(*self.replacements.items(), (values[i] for i in positions))):
+            for i in positions:
+                values[i] = self(values[i])
+        else:
+            joined = separator.join(values[i] for i in positions)
+            for i, val in zip(positions, self(joined).split(separator)):
+                values[i] = val
+
+        if isinstance(strings, pd.Series):
+            return pd.Series(values, index=strings.index, name=strings.name)
+        return values
 
-    # Create a big OR regex that matches any of the substrings to replace
-    regexp = re.compile('|'.join(map(re.escape, substrs)))
 
-    # For each match, look up the new string in the replacements
-    return regexp.sub(lambda match: replacements[match.group(0)], string)
+def trie_pattern(keys):
+    """
+    Return a regex pattern matching the longest of the keys, factorised by prefixes.
+    """
+    trie = {}
+    for key in keys:
+        node = trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def node_pattern(node):
+        is_end = '' in node
+        alternatives = [re.escape(char) + node_pattern(child)
+                        for char, child in sorted(node.items()) if char]
+        if not alternatives:
+            return ''
 
+        pattern = (alternatives[0] if len(alternatives) == 1
+                   else '(?:' + '|'.join(alternatives) + ')')
+        # greedy optional child : prefer the longest key
+        if is_end:
+            pattern = '(?:' + pattern + ')?'
+        return pattern
 
-def write_df(df, filename, names=[]):
+    return node_pattern(trie)
+
+
+def write_df(df, filename, names=[], n_jobs=None, compression=None, chunksize=None):
     """
-    Write a pandas dataframe in csv or excel.
+    Write pandas dataframes in csv, excel, parquet or feather.
 
-    :param DataFrame df: DataFrame to save
+    :param DataFrame df: DataFrame or list of DataFrames to save
     :param str filename: output file name
+    :param list names: names of the sheets, or suffixes of the file names
+    :param int n_jobs: number of files written concurrently (default=None=one per frame up to the number of cpus)
+    :param str compression: compression codec of csv, parquet and feather files
+    :param int chunksize: number of rows serialized at once (default=None=whole frame)
+
+    :return list: written files
 
     The format of the ouput file is determined by the extension :
-    - xlsx, xls : excel
-    - rest csv
+    - xlsx, xls : excel, one sheet per frame
+    - parquet, feather : one file <stem>_<name> per frame
+    - rest csv, one file <stem>_<name> per frame
+
+    A single frame without name is written in filename.
+    Files are written in a temporary file renamed once complete.
+    Parquet and feather files store the columns of the frames, not their index.
     """
+    filename = pathlib.Path(filename)
     if type(df).__name__ == 'DataFrame':
         df = [df]
+    sheet_names = [n or 'sheet{}'.format(i)
+                   for i, (_, n) in enumerate(itertools.zip_longest(df, names[:len(df)], fillvalue=''))]
+
+    if filename.suffix in ['.xlsx', '.xls']:
+        with _atomic_filename(filename) as tmp_filename:
+            with pd.ExcelWriter(str(tmp_filename)) as writer:
+                for f, n in zip(df, sheet_names):
+                    f.to_excel(writer, n)
+        return [filename]
+
+    if len(df) == 1 and not names:
+        filenames = [filename]
+    else:
+        filenames = [filename.with_name('{}_{}{}'.format(filename.stem, n, filename.suffix))
+                     for n in sheet_names]
+
+    n_jobs = n_jobs or min(len(df), os.cpu_count() or 1)
+    write = functools.partial(
+        _write_frame, compression=compression, chunksize=chunksize)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(n_jobs, 1)) as executor:
+        list(executor.map(write, df, filenames))
+
+    return filenames
 
-    is_excel = filename.suffix in ['.xlsx', '.xls']
-    writer = pd.ExcelWriter(filename) if is_excel else None
 
-    for i, f, n in enumerate(itertools.zip_longest(df, names, fillvalues='')):
-        n = n or 'sheet{}'.format(i)
-        if is_excel:
-            f.to_excel(writer, n)
+def _write_frame(frame, filename, compression=None, chunksize=None):
+    """
+    Write a single frame in csv, parquet or feather according to the extension of filename.
+    """
+    with _atomic_filename(filename) as tmp_filename:
+        if filename.suffix not in ['.parquet', '.feather']:
+            frame.to_csv(str(tmp_filename), compression=compression or None,
+                         chunksize=chunksize)
+            return
+
+        import pyarrow
+        # the schema is inferred on the whole frame, a chunk may only hold missing values
+        schema = pyarrow.Schema.from_pandas(frame, preserve_index=False)
+        chunksize = chunksize or max(len(frame), 1)
+        chunks = (frame.iloc[start:start+chunksize]
+                  for start in range(0, max(len(frame), 1), chunksize))
+
+        if filename.suffix == '.parquet':
+            import pyarrow.parquet
+            writer = pyarrow.parquet.ParquetWriter(
+                str(tmp_filename), schema, compression=compression or 'snappy')
         else:
-            f.to_csv(filename.with_suffix('_'+n))
+            import pyarrow.ipc
+            writer = pyarrow.ipc.new_file(str(tmp_filename), schema, options=pyarrow.ipc.IpcWriteOptions(
+                compression=compression))
+
+        with writer:
+            for chunk in chunks:
+                writer.write_table(pyarrow.Table.from_pandas(
+                    chunk, schema=schema, preserve_index=False))
 
-    if writer:
-        writer.save()
+
+@contextlib.contextmanager
+def _atomic_filename(filename):
+    """
+    Yield a temporary file name renamed into filename if no exception is raised.
+    """
+    tmp_filename = filename.with_name(
+        '.{}.tmp{}'.format(filename.stem, filename.suffix))
+    try:
+        yield tmp_filename
+        os.replace(str(tmp_filename), str(filename))
+    finally:
+        if tmp_filename.exists():
+            tmp_filename.unlink()
 
 
-def spreadsheet(filename, sheet_name=0, *args, **kwargs):
+def spreadsheet(filename, sheet_name=0, *args, columns=None, cache=False, cache_dir=None, **kwargs):
     """
     Return the file content as a pandas DataFrame.
-    If not excel, the file is interpreted as csv.
+    If not excel or columnar, the file is interpreted as csv.
 
-    :param str filename: input file. Excel extensions .xls, .xlsx
+    :param str filename: input file. Excel extensions .xls, .xlsx, columnar extensions .parquet, .feather, .arrow
     :param str,int sheet_name: Name of number of the sheet to read in case of excel
+    :param list columns: columns to read (default=None=all)
+    :param bool cache: for excel and csv, keep a feather copy of the content next to the file
+    :param str cache_dir: directory of the feather copies (default=None=directory of the file)
+
+    Feather and Arrow IPC files are memory mapped.
+    The cached copy is used as long as the size and modification time of
+    the file and the reading arguments are unchanged.
+    Content which can not be cached (e.g. mixed types columns, read-only directory) is returned uncached.
+    """
+    filename = pathlib.Path(filename)
+
+    if filename.suffix in columnar_extensions:
+        return read_columnar(filename, columns)
+
+    if not cache:
+        return _read_spreadsheet(filename, sheet_name, columns, *args, **kwargs)
+
+    stat = filename.stat()
+    key = hashlib.sha256(repr((sheet_name, args, sorted(kwargs.items()))).encode('utf-8')).hexdigest()[:16]
+    cache_dir = pathlib.Path(cache_dir) if cache_dir is not None else filename.parent
+    prefix = '.{}.{}.'.format(filename.name, key)
+    cache_filename = cache_dir/'{}{}-{}.feather'.format(prefix, stat.st_mtime_ns, stat.st_size)
+
+    if cache_filename.exists():
+        return read_columnar(cache_filename, columns)
+
+    data = _read_spreadsheet(filename, sheet_name, None, *args, **kwargs)
+    if isinstance(data, pd.DataFrame):
+        import pyarrow
+        import pyarrow.feather
+
+        try:
+            for old_filename in cache_dir.glob(prefix + '*.feather'):
+                old_filename.unlink()
+            with _atomic_filename(cache_filename) as tmp_filename:
+                pyarrow.feather.write_feather(pyarrow.Table.from_pandas(data), str(tmp_filename))
+        except (pyarrow.ArrowException, OSError) as exc:
+            logger.warning('spreadsheet_cache', extra={'filename': str(filename), 'error': repr(exc)})
+
+        if columns is not None:
+            data = data.loc[:, columns]
+
+    return data
+
+
+# Extensions of the files read by read_columnar
+columnar_extensions = ['.parquet', '.feather', '.arrow', '.ipc']
+
+
+def read_columnar(filename, columns=None):
+    """
+    Return the content of a parquet, feather or Arrow IPC file as a pandas DataFrame.
+
+    :param str filename: input file
+    :param list columns: columns to read (default=None=all)
+
+    Feather and Arrow IPC files are memory mapped.
     """
-    data = (
+    filename = pathlib.Path(filename)
+    if filename.suffix == '.parquet':
+        return pd.read_parquet(str(filename), columns=columns, memory_map=True)
+
+    import pyarrow.feather
+    return pyarrow.feather.read_table(str(filename), columns=columns, memory_map=True).to_pandas()
+
+
+def _read_spreadsheet(filename, sheet_name, columns, *args, **kwargs):
+    if columns is not None:
+        kwargs['usecols'] = columns
+    return (
         pd.read_excel(str(filename), sheet_name=sheet_name, *args, **kwargs)
         if filename.suffix in ['.xlsx', '.xls'] else
         pd.read_csv(str(filename), *args, **kwargs))
-
-    return data
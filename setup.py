@@ -19,5 +19,6 @@ setup(
     url="https://gitlab.com/cgoudet/pytools",
     packages=find_packages(),
     setup_requires=['setuptools-git-version'],
-    install_requires=requirements
+    install_requires=requirements,
+    extras_require={'columnar': ['pyarrow']}
 )